@@ -0,0 +1,203 @@
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+from text_preprocessor import normalize_arabic
+
+# Stored with the features: bump when extract_keywords changes
+KEYWORDS_VERSION = 2
+
+
+def extract_keywords(text):
+    """
+    Extract keywords from text (normalized Arabic words longer than 3 letters)
+
+    🔧 Chunks and queries go through the same normalize_arabic as
+    TextPreprocessor.clean_text, so "الخلية" matches "الخليه"
+    """
+    text = normalize_arabic(text)
+
+    words = re.findall(r'[\u0600-\u06FF]+', text)
+    keywords = [w for w in words if len(w) > 3]
+
+    return keywords
+
+
+class ChunkFeatures:
+    """
+    Per-chunk features used to score search results
+
+    Computed once at index time, row i belongs to position i of the
+    RAG texts:
+    - term_counts: sparse (chunks x vocabulary) keyword counts
+    - length_score: 1.0 for 100-1000 chars, lower for short texts
+    - diversity_score: unique words / total words
+
+    At query time the quality of all candidates is computed in one
+    vectorized pass instead of re-tokenizing every candidate text.
+
+    The same counts, stored column-wise (one posting list per term),
+    serve as the inverted index for BM25 keyword search.
+    """
+
+    def __init__(self):
+        self.vocabulary = {}
+        self.term_counts = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self.length_score = np.zeros(0, dtype=np.float32)
+        self.diversity_score = np.zeros(0, dtype=np.float32)
+        self._postings = None  # CSC copy of term_counts, built on first BM25 query
+        self._doc_lengths = None
+
+    def __len__(self):
+        return len(self.length_score)
+
+    @classmethod
+    def build(cls, texts):
+        features = cls()
+        features.append(texts)
+        return features
+
+    def append(self, texts):
+        """Compute features for new texts and add them as new rows"""
+        rows, cols, counts = [], [], []
+        length_score = []
+        diversity_score = []
+
+        for row, text in enumerate(texts):
+            term_counts = {}
+            for word in extract_keywords(text):
+                col = self.vocabulary.setdefault(word, len(self.vocabulary))
+                term_counts[col] = term_counts.get(col, 0) + 1
+
+            rows.extend([row] * len(term_counts))
+            cols.extend(term_counts.keys())
+            counts.extend(term_counts.values())
+
+            if 100 <= len(text) <= 1000:
+                length_score.append(1.0)
+            elif len(text) < 100:
+                length_score.append(len(text) / 100)
+            else:
+                length_score.append(0.8)
+
+            words = text.split()
+            diversity_score.append(
+                min(len(set(words)) / len(words), 1.0) if words else 0.0)
+
+        new_counts = sparse.csr_matrix(
+            (np.array(counts, dtype=np.int32), (rows, cols)),
+            shape=(len(length_score), len(self.vocabulary)))
+
+        old_counts = self.term_counts
+        old_counts.resize((old_counts.shape[0], len(self.vocabulary)))
+        self.term_counts = sparse.vstack([old_counts, new_counts], format="csr")
+
+        self.length_score = np.concatenate(
+            [self.length_score, np.array(length_score, dtype=np.float32)])
+        self.diversity_score = np.concatenate(
+            [self.diversity_score, np.array(diversity_score, dtype=np.float32)])
+        self._postings = None
+
+    def keep(self, positions):
+        """Keep only the given rows (after chunks were removed)"""
+        positions = np.asarray(positions, dtype=np.int64)
+        self.term_counts = self.term_counts[positions]
+        self.length_score = self.length_score[positions]
+        self.diversity_score = self.diversity_score[positions]
+        self._postings = None
+
+    def quality(self, positions, query):
+        """
+        Quality scores of several chunks for one query
+
+        Returns a dict of arrays (one value per position):
+        keyword_match, length_score, diversity_score, overall_score
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        query_words = set(extract_keywords(query))
+
+        keyword_match = np.zeros(len(positions), dtype=np.float32)
+        query_cols = [self.vocabulary[w] for w in query_words if w in self.vocabulary]
+
+        if query_cols and len(positions):
+            matched = self.term_counts[positions][:, query_cols] > 0
+            keyword_match = np.asarray(matched.sum(axis=1)).ravel() / len(query_words)
+
+        length_score = self.length_score[positions]
+        diversity_score = self.diversity_score[positions]
+
+        return {
+            "keyword_match": keyword_match,
+            "length_score": length_score,
+            "diversity_score": diversity_score,
+            "overall_score": keyword_match * 0.5 + length_score * 0.3 + diversity_score * 0.2
+        }
+
+    def bm25(self, query, k1=1.5, b=0.75):
+        """
+        BM25 scores of every chunk for the query keywords
+
+        Walks the posting list of each query term, so the cost depends on
+        how many chunks contain the terms, not on the corpus size.
+        """
+        scores = np.zeros(len(self), dtype=np.float32)
+        query_cols = {self.vocabulary[w] for w in extract_keywords(query) if w in self.vocabulary}
+        if not query_cols:
+            return scores
+
+        if self._postings is None:
+            self._postings = self.term_counts.tocsc()
+            self._doc_lengths = np.asarray(self.term_counts.sum(axis=1)).ravel()
+
+        doc_count = len(self)
+        average_length = max(float(self._doc_lengths.mean()), 1.0)
+
+        for col in query_cols:
+            start, end = self._postings.indptr[col], self._postings.indptr[col + 1]
+            rows = self._postings.indices[start:end]
+            term_freq = self._postings.data[start:end].astype(np.float32)
+
+            idf = np.log(1 + (doc_count - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = k1 * (1 - b + b * self._doc_lengths[rows] / average_length)
+            scores[rows] += idf * term_freq * (k1 + 1) / (term_freq + norm)
+
+        return scores
+
+    def save(self, path):
+        """Write the features to one .npz file (temp file + rename)"""
+        path = Path(path)
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        counts = self.term_counts.tocsr()
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                terms=np.array(terms, dtype=str),
+                data=counts.data,
+                indices=counts.indices,
+                indptr=counts.indptr,
+                shape=np.array(counts.shape),
+                length_score=self.length_score,
+                diversity_score=self.diversity_score,
+                keywords_version=np.array(KEYWORDS_VERSION)
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Features saved at path, or None if their keywords are outdated"""
+        features = cls()
+        with np.load(path, allow_pickle=False) as data:
+            if "keywords_version" not in data.files or int(data["keywords_version"]) != KEYWORDS_VERSION:
+                return None
+            features.vocabulary = {str(term): col for col, term in enumerate(data["terms"])}
+            features.term_counts = sparse.csr_matrix(
+                (data["data"], data["indices"], data["indptr"]),
+                shape=tuple(data["shape"]))
+            features.length_score = data["length_score"]
+            features.diversity_score = data["diversity_score"]
+        return features
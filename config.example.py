@@ -19,10 +19,39 @@ CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 100
 TOP_K_RESULTS = 5
 
+# RAG index settings
+RAG_INDEX_TYPE = "flat"  # flat, ivf_flat, ivf_pq, hnsw
+RAG_NPROBE = 16  # IVF lists visited per query
+RAG_EF_SEARCH = 64  # HNSW candidate list size
+RAG_QUANTIZATION = None  # None (float32), "fp16" or "int8"
+RAG_MMR_LAMBDA = 0.7  # relevance vs. diversity of results (1.0 = no diversification, None = off)
+
+# Optional cross-encoder reranking (None = off),
+# e.g. "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+RAG_RERANKER_MODEL = None
+RAG_RERANK_TOP_N = 20  # candidates scored per query
+RAG_RERANK_BUDGET_MS = 150  # skip reranking when it would take longer
+
+# Sentence encoder backend ("torch" or "onnx")
+RAG_ENCODER_BACKEND = "torch"
+RAG_ONNX_QUANTIZE = False  # dynamic int8 quantization of the ONNX model
+
+# Shared search server (python rag_server.py). None = every bot process
+# loads its own model and index. Unix socket path, or "127.0.0.1:8765"
+# on Windows.
+RAG_SERVER_ADDRESS = None
+
+# Micro-batching of concurrent searches (0 = off)
+RAG_BATCH_WAIT_MS = 5  # how long the first query waits for others
+RAG_MAX_BATCH_SIZE = 32
+
 # Text processing settings
 MIN_TEXT_LENGTH = 50
 MAX_TEXT_LENGTH = 1000
 
 # File paths
 PDF_DIRECTORY = "pdfs"
-EXTRACTED_TEXT_DIRECTORY = "extracted_texts"
\ No newline at end of file
+EXTRACTED_TEXT_DIRECTORY = "extracted_texts"
+
+# PDF extraction
+PDF_WORKERS = None  # processes for page extraction/OCR (None = all cores, 1 = serial)
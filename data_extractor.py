@@ -2,14 +2,73 @@ import fitz  # PyMuPDF
 import pytesseract
 from PIL import Image, ImageEnhance, ImageFilter
 import io
+import os
 import re
+import time
 import unicodedata
+from collections import deque
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from page_cache import PageCache, file_digest, settings_digest
 
 pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
 
+# Part of the page cache key: bump when _deep_clean or the OCR steps change
+EXTRACTION_VERSION = 2
+
+_worker_extractor = None  # PDFExtractor of a pool process
+
+
+def _init_worker(settings):
+    """Pool process setup: an extractor with the parent's settings"""
+    global _worker_extractor
+    # One Tesseract thread per process: the pool already uses all cores
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    _worker_extractor = PDFExtractor()
+    for name, value in settings.items():
+        setattr(_worker_extractor, name, value)
+
+
+def _extract_pages(pdf_path, page_nums):
+    """
+    🆕 Worker: (cleaned text, cacheable, OCR timing or None) of some
+    pages of one PDF, in the given order
+    """
+    extractor = _worker_extractor or PDFExtractor()
+    results = []
+    with fitz.open(pdf_path) as doc:
+        for page_num in page_nums:
+            text, cacheable = extractor._extract_page(doc[page_num])
+            results.append((text, cacheable, extractor.ocr_timings.pop(page_num + 1, None)))
+    return results
+
+
 class PDFExtractor:
-    def __init__(self):
+    def __init__(self, workers=1, pages_per_task=4, page_cache=None):
+        """
+        Args:
+            workers: Processes used for extraction (None = all cores, 1 = serial)
+            pages_per_task: Pages each worker handles per task (small ranges
+                balance slow OCR pages across workers)
+            page_cache: Path of the page cache database (None = no cache)
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.pages_per_task = pages_per_task
+        self.page_cache = PageCache(page_cache) if page_cache else None
+
+        # OCR settings (part of the page cache key)
+        self.ocr_scales = (2.0, 3.0)  # render scales, tried from low to high
+        self.ocr_min_confidence = 60  # mean word confidence that stops escalation
+        self.ocr_config = r'--oem 3 --psm 6 -l ara'
+        self.ocr_min_text_length = 100  # OCR pages whose text layer is shorter
+        self.blank_check_scale = 0.5
+        self.blank_ink_ratio = 0.002  # pages with less ink than this are blank
+
+        # 🆕 Per-page OCR details of the last PDF: {page number: {...}}
+        self.ocr_timings = {}
+
         self.arabic_reshaper = None
         try:
             import arabic_reshaper
@@ -19,57 +78,157 @@ class PDFExtractor:
         except:
             print("⚠️ تحذير: arabic_reshaper غير متوفر") # Warning: arabic_reshaper is not available
 
+    def settings(self):
+        """Settings that change the extracted text"""
+        return {
+            "ocr_scales": list(self.ocr_scales),
+            "ocr_min_confidence": self.ocr_min_confidence,
+            "blank_check_scale": self.blank_check_scale,
+            "blank_ink_ratio": self.blank_ink_ratio,
+            "ocr_config": self.ocr_config,
+            "ocr_min_text_length": self.ocr_min_text_length
+        }
+
     def process_pdf_page_by_page(self, pdf_path):
-        """Professional text extraction from PDF"""
+        """
+        Professional text extraction from PDF
+
+        🆕 With workers > 1, page ranges are extracted in a process pool
+        and the pages are still yielded one by one, in page order.
+
+        🆕 With a page cache, pages already extracted from the same PDF
+        content with the same settings are read back instead of being
+        extracted (and OCRed) again.
+        """
         print(f"\n{'='*70}")
         print(f"📖 معالجة: {pdf_path}") # Processing: {pdf_path}
         print(f"{'='*70}\n")
 
         try:
-            doc = fitz.open(pdf_path)
-            total_pages = len(doc)
+            with fitz.open(pdf_path) as doc:
+                total_pages = len(doc)
             print(f"📄 عدد الصفحات: {total_pages}\n") # Number of pages: {total_pages}
 
-            successful_pages = 0
+            self.ocr_timings = {}
+            cached = {}
+            if self.page_cache is not None:
+                pdf_digest = file_digest(pdf_path)
+                settings_key = settings_digest(
+                    dict(self.settings(), version=EXTRACTION_VERSION))
+                cached = self.page_cache.get_pages(pdf_digest, settings_key)
+                if cached:
+                    print(f"💾 صفحات محفوظة مسبقاً: {len(cached)}/{total_pages}\n") # Pages already cached
+
+            missing = [page_num for page_num in range(total_pages) if page_num not in cached]
+            if self.workers > 1 and len(missing) > self.pages_per_task:
+                extracted = self._extract_pages_parallel(pdf_path, missing)
+            else:
+                extracted = self._extract_pages_serial(pdf_path, missing)
 
-            for page_num in range(total_pages):
-                page = doc[page_num]
-
-                # Extract text
-                raw_text = page.get_text("text")
-
-                # Deep cleaning
-                cleaned_text = self._deep_clean(raw_text)
-
-                # If the text is short, try OCR
-                if len(cleaned_text) < 100:
-                    ocr_text = self._extract_with_ocr(page)
-                    if ocr_text:
-                        cleaned_text = self._deep_clean(ocr_text)
-
-                # Check quality
-                if self._is_quality_text(cleaned_text):
-                    successful_pages += 1
-                    print(f"✅ صفحة {page_num + 1}: {len(cleaned_text)} حرف") # Page {page_num + 1}: {len(cleaned_text)} characters
-
-                    # Show preview
-                    preview = self._get_preview(cleaned_text, 80)
-                    print(f"   📝 {preview}\n")
-
-                    yield cleaned_text, page_num + 1
-                else:
-                    print(
-                        f"⏭️  صفحة {page_num + 1}: تم تخطيها (جودة منخفضة)\n") # Page {page_num + 1}: Skipped (low quality)
+            successful_pages = 0
 
-            doc.close()
+            with closing(extracted):
+                for page_num in range(total_pages):
+                    if page_num in cached:
+                        cleaned_text = cached[page_num]
+                    else:
+                        _, cleaned_text, cacheable = next(extracted)
+                        # Pages whose OCR failed are extracted again next time
+                        if self.page_cache is not None and cacheable:
+                            self.page_cache.put(pdf_digest, page_num, settings_key, cleaned_text)
+
+                    # Check quality
+                    if self._is_quality_text(cleaned_text):
+                        successful_pages += 1
+                        print(f"✅ صفحة {page_num + 1}: {len(cleaned_text)} حرف{self._ocr_note(page_num + 1)}") # Page {page_num + 1}: {len(cleaned_text)} characters
+
+                        # Show preview
+                        preview = self._get_preview(cleaned_text, 80)
+                        print(f"   📝 {preview}\n")
+
+                        yield cleaned_text, page_num + 1
+                    else:
+                        print(
+                            f"⏭️  صفحة {page_num + 1}: تم تخطيها (جودة منخفضة){self._ocr_note(page_num + 1)}\n") # Page {page_num + 1}: Skipped (low quality)
 
             print(f"{'='*70}")
             print(f"✅ نجح استخراج {successful_pages}/{total_pages} صفحة") # Successfully extracted {successful_pages}/{total_pages} pages
+            if self.ocr_timings:
+                summary = self.ocr_summary()
+                # OCR: pages, blank pages skipped, escalated to a higher resolution, seconds
+                print(f"🔍 OCR: {summary['pages']} صفحة، {summary['blank']} فارغة، "
+                      f"{summary['escalated']} بدقة أعلى، {summary['seconds']:.1f} ث")
             print(f"{'='*70}\n")
 
         except Exception as e:
             print(f"❌ خطأ: {e}\n") # Error: {e}
 
+    def _extract_pages_serial(self, pdf_path, page_nums):
+        """Yield (page index, cleaned text, cacheable) for the given pages, in this process"""
+        with fitz.open(pdf_path) as doc:
+            for page_num in page_nums:
+                yield (page_num,) + self._extract_page(doc[page_num])
+
+    def _extract_pages_parallel(self, pdf_path, page_nums):
+        """
+        🆕 Yield (page index, cleaned text, cacheable) for the given pages, extracted by a process pool
+
+        Each task opens the document itself and handles pages_per_task
+        pages. At most two tasks per worker are queued ahead of the page
+        being yielded, so results stream out in order without piling up.
+        """
+        tasks = iter([page_nums[start:start + self.pages_per_task]
+                      for start in range(0, len(page_nums), self.pages_per_task)])
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(self.settings(),))
+        print(f"⚙️ استخراج متوازي: {self.workers} عمليات\n") # Parallel extraction: {workers} processes
+
+        try:
+            pending = deque()
+            for task in islice(tasks, self.workers * 2):
+                pending.append((task, pool.submit(_extract_pages, pdf_path, task)))
+
+            while pending:
+                task, future = pending.popleft()
+                texts = future.result()
+
+                for next_task in islice(tasks, 1):
+                    pending.append((next_task, pool.submit(_extract_pages, pdf_path, next_task)))
+
+                for page_num, (text, cacheable, timing) in zip(task, texts):
+                    if timing is not None:
+                        self.ocr_timings[page_num + 1] = timing
+                    yield page_num, text, cacheable
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _extract_page(self, page):
+        """
+        Cleaned text of one page (OCR when the text layer is too short)
+
+        Returns (text, cacheable): cacheable is False when OCR failed
+        (e.g. Tesseract missing), so the page is not stored in the page cache
+        """
+        # Extract text
+        raw_text = page.get_text("text")
+
+        # Deep cleaning
+        cleaned_text = self._deep_clean(raw_text)
+
+        cacheable = True
+
+        # If the text is short, try OCR
+        if len(cleaned_text) < self.ocr_min_text_length:
+            start = time.perf_counter()
+            ocr_text, details = self._extract_with_ocr(page)
+            details["seconds"] = time.perf_counter() - start
+            self.ocr_timings[page.number + 1] = details
+            if ocr_text:
+                cleaned_text = self._deep_clean(ocr_text)
+            cacheable = details["result"] != "error"
+
+        return cleaned_text, cacheable
+
     def _deep_clean(self, text):
         """Deep and advanced cleaning for Arabic text"""
         if not text:
@@ -138,28 +297,98 @@ class PDFExtractor:
         return text
 
     def _extract_with_ocr(self, page):
-        """Enhanced OCR"""
+        """
+        Enhanced OCR - adaptive
+
+        🆕 1. Blank check: a small grayscale render is OCRed only if its
+              histogram shows enough dark (ink) pixels
+           2. OCR at the lowest scale in ocr_scales
+           3. Escalate to the next scale only while the mean word
+              confidence is below ocr_min_confidence (a render with no
+              words at all is not retried)
+
+        Returns (text, details) where details says what was done:
+        {"result": "blank" | "ocr" | "error", "scale", "confidence"}
+        """
         try:
-            # Convert to high-resolution image
-            mat = fitz.Matrix(3.0, 3.0)
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            img = Image.open(io.BytesIO(img_data))
+            if self._is_blank_page(page):
+                return "", {"result": "blank"}
 
-            # Image processing
-            img = img.convert('L')
-            enhancer = ImageEnhance.Contrast(img)
-            img = enhancer.enhance(2.5)
-            img = img.filter(ImageFilter.SHARPEN)
+            best_text, best_confidence, scale = "", -1.0, None
+            for scale in self.ocr_scales:
+                text, confidence, words = self._ocr_at_scale(page, scale)
+                if confidence > best_confidence:
+                    best_text, best_confidence = text, confidence
 
-            # OCR
-            custom_config = r'--oem 3 --psm 6 -l ara'
-            text = pytesseract.image_to_string(img, config=custom_config)
+                if words == 0 or confidence >= self.ocr_min_confidence:
+                    break
 
-            return text
+            return best_text, {"result": "ocr", "scale": scale, "confidence": best_confidence}
 
         except Exception as e:
+            return "", {"result": "error"}
+
+    def _is_blank_page(self, page):
+        """🆕 Near-blank page: (almost) no dark pixels, or (almost) only dark ones"""
+        mat = fitz.Matrix(self.blank_check_scale, self.blank_check_scale)
+        pix = page.get_pixmap(matrix=mat, colorspace=fitz.csGRAY, alpha=False)
+        img = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+
+        histogram = img.histogram()
+        ink = sum(histogram[:128]) / max(sum(histogram), 1)
+        return ink < self.blank_ink_ratio or ink > 1 - self.blank_ink_ratio
+
+    def _ocr_at_scale(self, page, scale):
+        """OCR one render of the page: (text, mean word confidence, word count)"""
+        # Convert to an image at the requested resolution
+        mat = fitz.Matrix(scale, scale)
+        pix = page.get_pixmap(matrix=mat)
+        img_data = pix.tobytes("png")
+        img = Image.open(io.BytesIO(img_data))
+
+        # Image processing
+        img = img.convert('L')
+        enhancer = ImageEnhance.Contrast(img)
+        img = enhancer.enhance(2.5)
+        img = img.filter(ImageFilter.SHARPEN)
+
+        # OCR with per-word confidences
+        data = pytesseract.image_to_data(
+            img, config=self.ocr_config, output_type=pytesseract.Output.DICT)
+
+        lines = {}
+        confidences = []
+        for i, word in enumerate(data["text"]):
+            confidence = float(data["conf"][i])
+            if not word.strip() or confidence < 0:
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            lines.setdefault(key, []).append(word)
+            confidences.append(confidence)
+
+        text = "\n".join(" ".join(words) for words in lines.values())
+        mean_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        return text, mean_confidence, len(confidences)
+
+    def _ocr_note(self, page_number):
+        """Short OCR note for the page log line"""
+        details = self.ocr_timings.get(page_number)
+        if details is None:
             return ""
+        if details["result"] == "blank":
+            return " (صفحة فارغة)"  # blank page
+        return f" (OCR {details['seconds']:.1f} ث)"
+
+    def ocr_summary(self):
+        """🆕 Totals of ocr_timings: pages, blank pages skipped, escalations, seconds"""
+        timings = self.ocr_timings.values()
+        return {
+            "pages": len(self.ocr_timings),
+            "blank": sum(1 for t in timings if t["result"] == "blank"),
+            "escalated": sum(1 for t in timings
+                             if t["result"] == "ocr" and t["scale"] != self.ocr_scales[0]),
+            "seconds": sum(t["seconds"] for t in timings)
+        }
 
     def _is_quality_text(self, text):
         """Text quality check"""
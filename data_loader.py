@@ -4,30 +4,34 @@ from database_manager import DatabaseManager
 from text_preprocessor import TextPreprocessor
 
 class DataLoader:
-    def __init__(self):
+    def __init__(self, batch_size=500):
         self.db_manager = DatabaseManager()
         self.preprocessor = TextPreprocessor()
+        self.batch_size = batch_size  # 🆕 rows per transaction
     
     def load_from_json(self, json_file):
         """Load data from a JSON file"""
         with open(json_file, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
-        for subject in data:
-            for chapter in data[subject]:
-                for content in data[subject][chapter]:
-                    # Clean the content
-                    cleaned_content = self.preprocessor.preprocess_text(content['text'])
-                    
-                    # Save to database
-                    self.db_manager.add_textbook_content(
-                        subject,
-                        content.get('grade_level', 'secondary'),
-                        chapter,
-                        cleaned_content,
-                        content.get('page_number', 0),
-                        content.get('content_type', 'text')
-                    )
+        def rows():
+            for subject in data:
+                for chapter in data[subject]:
+                    for content in data[subject][chapter]:
+                        # Clean the content
+                        cleaned_content = self.preprocessor.preprocess_text(content['text'])
+                        
+                        yield (
+                            subject,
+                            content.get('grade_level', 'secondary'),
+                            chapter,
+                            cleaned_content,
+                            content.get('page_number', 0),
+                            content.get('content_type', 'text')
+                        )
+        
+        # 🆕 Save to database in batched transactions
+        return self.db_manager.add_textbook_contents(rows(), batch_size=self.batch_size)
     
     def load_from_txt(self, txt_file, subject, chapter_name="Chapter 1"):
         """Load data from a text file"""
@@ -37,16 +41,18 @@ class DataLoader:
         # Split the text into chunks
         chunks = self.preprocessor.chunk_text(text)
         
-        # Save the chunks to the database
-        for i, chunk in enumerate(chunks):
-            cleaned_chunk = self.preprocessor.preprocess_text(chunk)
-            
-            self.db_manager.add_textbook_content(
-                subject,
-                "secondary",
-                chapter_name,
-                cleaned_chunk,
-                i + 1,
-                "text"
-            )
-            
\ No newline at end of file
+        def rows():
+            for i, chunk in enumerate(chunks):
+                cleaned_chunk = self.preprocessor.preprocess_text(chunk)
+                
+                yield (
+                    subject,
+                    "secondary",
+                    chapter_name,
+                    cleaned_chunk,
+                    i + 1,
+                    "text"
+                )
+        
+        # 🆕 Save the chunks to the database in batched transactions
+        return self.db_manager.add_textbook_contents(rows(), batch_size=self.batch_size)
\ No newline at end of file
@@ -1,16 +1,195 @@
 import sqlite3
 from datetime import datetime
 import hashlib
+import re
+import threading
+from itertools import islice
+from text_preprocessor import normalize_arabic
+
+
+def fts_normalize(text):
+    """
+    🆕 Text as stored in (and searched against) the full-text index
+
+    normalize_arabic plus light stemming: the definite article, alone or
+    after و/ف/ب/ك, and the لل prefix are dropped, so "والخلية" and
+    "خلية" index the same token
+    """
+    if not text:
+        return ""
+    text = normalize_arabic(text)
+    return re.sub(r'(?<!\w)(?:[وفبك]?ال|لل)(?=\w\w)', '', text)
+
+
+def _fts_match_query(keywords):
+    """FTS5 MATCH expression: any keyword, each one as a phrase of whole words"""
+    phrases = []
+    for keyword in keywords:
+        words = re.findall(r'\w+', fts_normalize(keyword))
+        if words:
+            phrases.append('"' + ' '.join(words) + '"')
+    return ' OR '.join(phrases)
+
+# 🆕 Schema migrations: (version, statements), applied in order by init_db
+SCHEMA_MIGRATIONS = [
+    (1, [
+        # get_tasks, get_tasks_by_date and the task counts of
+        # get_detailed_user_stats (covering: no table lookups)
+        '''
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_status_due
+        ON tasks (user_id, status, due_date, priority DESC, task_name)
+        ''',
+        # get_textbook_content / get_textbook_rows by subject
+        '''
+        CREATE INDEX IF NOT EXISTS idx_textbook_content_subject
+        ON textbook_content (subject)
+        '''
+    ]),
+    (2, [
+        # Full-text index of the normalized content (rowid = textbook_content.id).
+        # Rows are added by DatabaseManager in the insert transaction and
+        # by _sync_fts at startup, so the schema needs no app-defined SQL
+        # function and any SQLite client can still write the table
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS textbook_fts USING fts5(
+            content,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS textbook_fts_delete AFTER DELETE ON textbook_content
+        BEGIN
+            DELETE FROM textbook_fts WHERE rowid = old.id;
+        END
+        '''
+    ]),
+    (3, [
+        # Earlier version 2 triggers called arabic_normalize
+        'DROP TRIGGER IF EXISTS textbook_fts_insert',
+        'DROP TRIGGER IF EXISTS textbook_fts_update',
+        # Edited content is dropped from the index and re-indexed by _sync_fts
+        '''
+        CREATE TRIGGER IF NOT EXISTS textbook_fts_update AFTER UPDATE OF content ON textbook_content
+        BEGIN
+            DELETE FROM textbook_fts WHERE rowid = old.id;
+        END
+        '''
+    ]),
+]
+
+# 🆕 Hot queries and the index each one must use: name -> (query, params, plan detail)
+HOT_QUERY_PLANS = {
+    "get_tasks": (
+        '''
+        SELECT id, task_name, due_date, priority, status FROM tasks
+        WHERE user_id = ? AND status = ?
+        ORDER BY due_date, priority DESC
+        ''', (1, 'pending'),
+        'COVERING INDEX idx_tasks_user_status_due (user_id=? AND status=?)'),
+    "get_tasks_all": (
+        '''
+        SELECT id, task_name, due_date, priority, status FROM tasks
+        WHERE user_id = ?
+        ORDER BY due_date, priority DESC
+        ''', (1,),
+        'COVERING INDEX idx_tasks_user_status_due (user_id=?)'),
+    "get_tasks_by_date": (
+        '''
+        SELECT id, task_name, due_date, priority, status FROM tasks
+        WHERE user_id = ? AND due_date = ? AND status = 'pending'
+        ORDER BY priority DESC
+        ''', (1, '2026-01-01'),
+        'COVERING INDEX idx_tasks_user_status_due '
+        '(user_id=? AND status=? AND due_date=?)'),
+    "pending_task_count": (
+        '''
+        SELECT COUNT(*) FROM tasks
+        WHERE user_id = ? AND status = 'pending'
+        ''', (1,),
+        'COVERING INDEX idx_tasks_user_status_due (user_id=? AND status=?)'),
+    "total_task_count": (
+        '''
+        SELECT COUNT(*) FROM tasks
+        WHERE user_id = ?
+        ''', (1,),
+        'COVERING INDEX idx_tasks_user_status_due (user_id=?)'),
+    "user_stats": (
+        '''
+        SELECT questions_asked, summaries_generated, quizzes_taken,
+               tasks_completed, last_active
+        FROM user_stats
+        WHERE user_id = ?
+        ''', (1,),
+        'INTEGER PRIMARY KEY (rowid=?)'),
+    "get_textbook_content": (
+        '''
+        SELECT chapter, content, page_number FROM textbook_content
+        WHERE subject = ?
+        ''', ('biology',),
+        'INDEX idx_textbook_content_subject (subject=?)'),
+    "search_textbook": (
+        '''
+        SELECT c.id, c.subject, c.chapter, c.content, c.page_number, -bm25(textbook_fts)
+        FROM textbook_fts JOIN textbook_content c ON c.id = textbook_fts.rowid
+        WHERE textbook_fts MATCH ? AND c.subject = ?
+        ORDER BY bm25(textbook_fts) LIMIT ?
+        ''', ('"خليه"', 'biology', 10),
+        'INTEGER PRIMARY KEY (rowid=?)'),
+}
 
 
 class DatabaseManager:
-    def __init__(self, db_path="study_assistant.db"):
+    def __init__(self, db_path="study_assistant.db", pooled=True, busy_timeout=5.0,
+                 cached_statements=256):
+        """
+        🆕 Connection pool: with pooled=True every thread keeps one open
+        connection and reuses it for all calls, in WAL journal mode
+        (readers and the writer no longer block each other) with
+        synchronous=NORMAL. busy_timeout (seconds) is how long a call
+        waits for another thread's write lock before failing, and
+        cached_statements is the size of each connection's prepared
+        statement cache. pooled=False opens and closes a connection per
+        call, as before.
+        """
         self.db_path = db_path
+        self.pooled = pooled
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
         self.init_db()
 
+    def _open(self, **kwargs):
+        return sqlite3.connect(self.db_path, timeout=self.busy_timeout, **kwargs)
+
+    def _connect(self):
+        """Connection for the current thread"""
+        if not self.pooled:
+            return self._open()
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open(cached_statements=self.cached_statements)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self._local.conn = conn
+        elif conn.in_transaction:
+            conn.rollback()  # left open by a call that failed before its commit
+        return conn
+
+    def _release(self, conn):
+        if not self.pooled:
+            conn.close()
+
+    def close(self):
+        """🆕 Close the current thread's pooled connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
     def init_db(self):
         """Create database tables - enhanced"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
         # Users table
@@ -78,11 +257,84 @@ class DatabaseManager:
         ''')
 
         conn.commit()
-        conn.close()
+
+        # 🆕 Versioned schema changes (indexes, ...)
+        self._migrate(conn)
+        self._sync_fts(conn)
+        self._release(conn)
+
+    def _sync_fts(self, conn):
+        """
+        🆕 Index the textbook rows missing from textbook_fts
+
+        Covers rows written outside DatabaseManager (sqlite3 shell,
+        restored backups) and rows whose content was edited, which the
+        update trigger removed from the index.
+        """
+        rows = conn.execute('''
+        SELECT id, content FROM textbook_content
+        WHERE id NOT IN (SELECT rowid FROM textbook_fts)
+        ''').fetchall()
+        if not rows:
+            return
+
+        conn.executemany('''
+        INSERT INTO textbook_fts (rowid, content) VALUES (?, ?)
+        ''', [(row_id, fts_normalize(content)) for row_id, content in rows])
+        conn.commit()
+
+    def _migrate(self, conn):
+        """
+        🆕 Apply the pending SCHEMA_MIGRATIONS
+
+        The schema version lives in PRAGMA user_version. Each migration
+        runs in its own write transaction, which re-checks the version,
+        so two processes starting together do not apply it twice.
+        """
+        for version, statements in SCHEMA_MIGRATIONS:
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= version:
+                continue
+
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if conn.execute('PRAGMA user_version').fetchone()[0] < version:
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(f'PRAGMA user_version = {int(version)}')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def schema_version(self):
+        """🆕 Current schema version (PRAGMA user_version)"""
+        conn = self._connect()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        self._release(conn)
+        return version
+
+    def verify_query_plans(self):
+        """
+        🆕 Check that every hot query is answered from its index
+
+        Runs EXPLAIN QUERY PLAN for each entry of HOT_QUERY_PLANS and
+        returns {name: plan} for the queries whose plan does not use the
+        expected index (an empty dict means all is well).
+        """
+        conn = self._connect()
+        problems = {}
+
+        for name, (query, params, expected) in HOT_QUERY_PLANS.items():
+            plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + query, params)]
+            if not any(expected in detail for detail in plan):
+                problems[name] = plan
+
+        self._release(conn)
+        return problems
 
     def add_user(self, user_id, username, first_name, last_name):
         """Add a new user"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
         registration_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -99,11 +351,11 @@ class DatabaseManager:
         ''', (user_id, registration_date))
 
         conn.commit()
-        conn.close()
+        self._release(conn)
 
     def add_task(self, user_id, task_name, due_date, priority=1):
         """Add a new task - enhanced"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
         created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -114,11 +366,11 @@ class DatabaseManager:
         ''', (user_id, task_name, due_date, priority, "pending", created_at))
 
         conn.commit()
-        conn.close()
+        self._release(conn)
 
     def get_tasks(self, user_id, status='pending'):
         """Get user tasks - enhanced"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
         if status == 'all':
@@ -135,12 +387,12 @@ class DatabaseManager:
             ''', (user_id, status))
 
         tasks = cursor.fetchall()
-        conn.close()
+        self._release(conn)
         return tasks
 
     def get_tasks_by_date(self, user_id, date):
         """🆕 Get tasks for a specific date"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
         cursor.execute('''
@@ -150,12 +402,12 @@ class DatabaseManager:
         ''', (user_id, date))
 
         tasks = cursor.fetchall()
-        conn.close()
+        self._release(conn)
         return tasks
 
     def update_task_status(self, task_id, new_status):
         """🆕 Update task status"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
         completed_at = None
@@ -169,11 +421,11 @@ class DatabaseManager:
         ''', (new_status, completed_at, task_id))
 
         conn.commit()
-        conn.close()
+        self._release(conn)
 
     def update_task_priority(self, task_id, new_priority):
         """🆕 Update task priority"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
         cursor.execute('''
@@ -183,33 +435,33 @@ class DatabaseManager:
         ''', (new_priority, task_id))
 
         conn.commit()
-        conn.close()
+        self._release(conn)
 
     def delete_task(self, task_id):
         """🆕 Delete a task - without updating stats"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
         cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
 
         conn.commit()
-        conn.close()
+        self._release(conn)
 
     def get_all_users(self):
         """🆕 Get all users"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
         cursor.execute(
             'SELECT user_id, username, first_name, last_name FROM users')
         users = cursor.fetchall()
 
-        conn.close()
+        self._release(conn)
         return users
 
     def update_user_stats(self, user_id, stat_type):
         """🔧 Update user statistics - enhanced"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
         last_active = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -246,11 +498,11 @@ class DatabaseManager:
             ''', (last_active, user_id))
 
         conn.commit()
-        conn.close()
+        self._release(conn)
 
     def get_user_stats(self, user_id):
         """Get user statistics"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
         cursor.execute('''
@@ -261,7 +513,7 @@ class DatabaseManager:
         ''', (user_id,))
 
         stats = cursor.fetchone()
-        conn.close()
+        self._release(conn)
 
         if stats:
             return {
@@ -274,24 +526,106 @@ class DatabaseManager:
         return None
 
     def add_textbook_content(self, subject, grade_level, chapter, content, page_number, content_type):
-        """Add textbook content"""
-        conn = sqlite3.connect(self.db_path)
+        """Add textbook content (returns the new row id)"""
+        conn = self._connect()
         cursor = conn.cursor()
 
         cursor.execute('''
         INSERT INTO textbook_content (subject, grade_level, chapter, content, page_number, content_type)
         VALUES (?, ?, ?, ?, ?, ?)
         ''', (subject, grade_level, chapter, content, page_number, content_type))
+        row_id = cursor.lastrowid
+
+        # 🆕 Full-text index, in the same transaction
+        cursor.execute('''
+        INSERT INTO textbook_fts (rowid, content) VALUES (?, ?)
+        ''', (row_id, fts_normalize(content)))
 
         conn.commit()
-        conn.close()
+        self._release(conn)
+        return row_id
+
+    def add_textbook_contents(self, rows, batch_size=500, return_ids=False):
+        """
+        🆕 Bulk insert of textbook content
+
+        Args:
+            rows: Iterable of (subject, grade_level, chapter, content,
+                page_number, content_type) tuples; consumed lazily
+            batch_size: Rows per transaction (one commit each)
+            return_ids: Return the new row ids, in input order
+
+        Returns the ids (return_ids=True) or the number of rows inserted.
+        """
+        # Own connection: the ingest PRAGMAs must not stay on a pooled one
+        conn = self._open(isolation_level=None)
+        cursor = conn.cursor()
+
+        # Ingest settings (this connection only): fewer syncs, bigger page cache
+        cursor.execute('PRAGMA synchronous = NORMAL')
+        cursor.execute('PRAGMA temp_store = MEMORY')
+        cursor.execute('PRAGMA cache_size = -65536')  # 64 MB
+
+        ids = []
+        inserted = 0
+        rows = iter(rows)
+
+        try:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+
+                # IMMEDIATE takes the write lock up front, so the AUTOINCREMENT
+                # ids of the batch are consecutive and end at sqlite_sequence
+                cursor.execute('BEGIN IMMEDIATE')
+                try:
+                    cursor.executemany('''
+                    INSERT INTO textbook_content (subject, grade_level, chapter, content, page_number, content_type)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ''', batch)
+
+                    cursor.execute('''
+                    SELECT seq FROM sqlite_sequence WHERE name = 'textbook_content'
+                    ''')
+                    last_id = cursor.fetchone()[0]
+                    batch_ids = range(last_id - len(batch) + 1, last_id + 1)
+
+                    # 🆕 Full-text index, in the same transaction
+                    cursor.executemany('''
+                    INSERT INTO textbook_fts (rowid, content) VALUES (?, ?)
+                    ''', [(row_id, fts_normalize(row[3])) for row_id, row in zip(batch_ids, batch)])
+
+                    if return_ids:
+                        ids.extend(batch_ids)
+
+                    cursor.execute('COMMIT')
+                except Exception:
+                    cursor.execute('ROLLBACK')
+                    raise
+
+                inserted += len(batch)
+        finally:
+            conn.close()
+
+        return ids if return_ids else inserted
 
     def get_textbook_content(self, subject, keywords=None):
-        """Get textbook content"""
-        conn = sqlite3.connect(self.db_path)
+        """
+        Get textbook content
+
+        🆕 With keywords, the chunks matching any of them are looked up in
+        the full-text index, best match first (see search_textbook)
+        """
+        if keywords and _fts_match_query(keywords):
+            return [(chapter, content, page_number) for _, _, chapter, content, page_number, _
+                    in self.search_textbook(keywords, subject, limit=None)]
+
+        conn = self._connect()
         cursor = conn.cursor()
 
         if keywords:
+            # Nothing the full-text index can match (punctuation, symbols...)
             query = f'''
             SELECT chapter, content, page_number FROM textbook_content
             WHERE subject = ? AND ({" OR ".join(["content LIKE ?" for _ in keywords])})
@@ -305,12 +639,71 @@ class DatabaseManager:
             ''', (subject,))
 
         content = cursor.fetchall()
-        conn.close()
+        self._release(conn)
         return content
 
+    def search_textbook(self, keywords, subject=None, limit=10):
+        """
+        🆕 Ranked keyword search over textbook content (FTS5)
+
+        Args:
+            keywords: List of keywords / phrases, or one string of words;
+                a chunk matches if it contains any of them (whole words,
+                compared after fts_normalize)
+            subject: Only this subject if given
+            limit: Maximum number of rows (None = all)
+
+        Returns (id, subject, chapter, content, page_number, score) rows,
+        best first; score is the BM25 relevance (higher is better).
+        """
+        if isinstance(keywords, str):
+            keywords = keywords.split()
+        match = _fts_match_query(keywords)
+        if not match:
+            return []
+
+        query = '''
+        SELECT c.id, c.subject, c.chapter, c.content, c.page_number, -bm25(textbook_fts)
+        FROM textbook_fts JOIN textbook_content c ON c.id = textbook_fts.rowid
+        WHERE textbook_fts MATCH ?
+        '''
+        params = [match]
+        if subject:
+            query += ' AND c.subject = ?'
+            params.append(subject)
+        query += ' ORDER BY bm25(textbook_fts) LIMIT ?'
+        params.append(-1 if limit is None else limit)
+
+        conn = self._connect()
+        rows = conn.execute(query, params).fetchall()
+        self._release(conn)
+        return rows
+
+    def get_textbook_rows(self, subjects=None):
+        """🆕 Get textbook content rows with their ids (for RAG index sync)"""
+        conn = self._connect()
+        cursor = conn.cursor()
+
+        if subjects:
+            query = f'''
+            SELECT id, subject, chapter, content, page_number FROM textbook_content
+            WHERE subject IN ({", ".join(["?" for _ in subjects])})
+            ORDER BY id
+            '''
+            cursor.execute(query, list(subjects))
+        else:
+            cursor.execute('''
+            SELECT id, subject, chapter, content, page_number FROM textbook_content
+            ORDER BY id
+            ''')
+
+        rows = cursor.fetchall()
+        self._release(conn)
+        return rows
+
     def update_user_activity(self, user_id, activity_type):
         """🆕 Update personal activity statistics"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
         last_active = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -347,11 +740,11 @@ class DatabaseManager:
             ''', (last_active, user_id))
 
         conn.commit()
-        conn.close()
+        self._release(conn)
 
     def get_detailed_user_stats(self, user_id):
         """🔧 Get detailed user statistics - enhanced"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
         # User statistics
@@ -385,7 +778,7 @@ class DatabaseManager:
         ''', (user_id,))
         total_tasks = cursor.fetchone()[0]
 
-        conn.close()
+        self._release(conn)
 
         if stats:
             return {
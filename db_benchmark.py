@@ -0,0 +1,99 @@
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from database_manager import DatabaseManager
+
+USERS = 50
+
+
+def _operations(db, user_id, i):
+    """One round of the task and stats calls the bot makes per message"""
+    db.update_user_stats(user_id, "question")
+    db.add_task(user_id, f"مهمة {i}", "2026-01-01", priority=i % 3 + 1)
+    tasks = db.get_tasks(user_id)
+    if tasks:
+        db.update_task_status(tasks[0][0], "completed")
+    db.get_detailed_user_stats(user_id)
+    return 5 if tasks else 4
+
+
+def _worker(db, thread_id, rounds, counts, errors):
+    operations = 0
+    for i in range(rounds):
+        try:
+            operations += _operations(db, (thread_id * rounds + i) % USERS + 1, i)
+        except sqlite3.OperationalError:  # "database is locked"
+            errors[thread_id] += 1
+    counts[thread_id] = operations
+    if db.pooled:
+        db.close()
+
+
+def run_mode(pooled, threads, rounds, work_dir):
+    """ops/sec of one mode on a fresh database"""
+    db_path = os.path.join(work_dir, f"{'pooled' if pooled else 'per_call'}_{threads}.db")
+    db = DatabaseManager(db_path, pooled=pooled)
+    for user_id in range(1, USERS + 1):
+        db.add_user(user_id, f"user{user_id}", "طالب", "")
+
+    counts = [0] * threads
+    errors = [0] * threads
+    workers = [threading.Thread(target=_worker, args=(db, t, rounds, counts, errors))
+               for t in range(threads)]
+
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - start
+
+    return {
+        "mode": "pooled+WAL" if pooled else "per-call",
+        "threads": threads,
+        "operations": sum(counts),
+        "seconds": seconds,
+        "ops_per_sec": sum(counts) / seconds,
+        "locked_errors": sum(errors)
+    }
+
+
+def run_benchmark(threads=(1, 4), rounds=500, work_dir=None):
+    """
+    Compare a connection per call (the old behaviour) with the
+    per-thread pool in WAL mode, on the task and stats methods
+    """
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="db_benchmark_")
+    results = []
+
+    try:
+        for thread_count in threads:
+            for pooled in (False, True):
+                result = run_mode(pooled, thread_count, rounds, work_dir)
+                results.append(result)
+                print(f"⏱️ {result['mode']:<11} threads={thread_count}: "
+                      f"{result['ops_per_sec']:,.0f} ops/s "
+                      f"({result['operations']} ops, {result['seconds']:.2f} s, "
+                      f"locked={result['locked_errors']})")
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DatabaseManager connection microbenchmark")
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, 4])
+    parser.add_argument("--rounds", type=int, default=500, help="rounds per thread")
+    parser.add_argument("--work-dir", default=None,
+                        help="put the databases here (e.g. the disk the bot uses)")
+    args = parser.parse_args()
+
+    run_benchmark(tuple(args.threads), args.rounds, args.work_dir)
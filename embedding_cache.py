@@ -0,0 +1,182 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache
+
+    - Keys are a stable digest of (model name + preprocessed text),
+      so they survive process restarts (unlike the builtin hash())
+    - Stored on disk as one float16 matrix (memory-mapped when loaded)
+      plus a key index (<path stem>_keys.npz). Every save writes a new
+      matrix file (<path stem>.<version>.npy) and then swaps the key
+      index, which names its matrix and row count, in one rename: a
+      reader never pairs keys with another save's matrix
+    - Matrices no longer named by the key index are deleted by a later
+      save once they are stale_after seconds old: younger ones may
+      belong to a save another process has not published yet
+    - Size-bounded: least recently used vectors are evicted first
+    - Thread-safe: search threads and the batcher share one instance
+    """
+
+    def __init__(self, path, model_name, max_entries=100000, dtype=np.float16,
+                 stale_after=600):
+        self.path = Path(path)
+        self.keys_path = self.path.with_name(self.path.stem + "_keys.npz")
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.dtype = dtype
+        self.stale_after = stale_after
+
+        # key -> row in the mapped matrix (int) or an in-memory vector
+        self._entries = OrderedDict()
+        self._vectors = None
+        # Reentrant: save() reloads the file it has just written
+        self._lock = threading.RLock()
+
+    def key(self, processed_text):
+        """Stable key for a preprocessed text"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(processed_text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _vector(self, entry):
+        if isinstance(entry, np.ndarray):
+            return entry
+        return self._vectors[entry]
+
+    def get(self, key):
+        """Return the cached vector (float32) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return self._vector(entry).astype(np.float32)
+
+    def put(self, key, vector):
+        """Store a vector and evict the oldest entries if over the limit"""
+        vector = np.asarray(vector, dtype=self.dtype)
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self):
+        """Map the cache from disk (oldest entries first)"""
+        with self._lock:
+            if not self.keys_path.exists():
+                return False
+
+            with np.load(self.keys_path, allow_pickle=False) as data:
+                if str(data["model_name"]) != self.model_name:
+                    # Vectors from another model are useless here
+                    return False
+                keys = data["keys"]
+                # Older caches kept the matrix at <path> itself
+                vectors_path = (self.path.with_name(str(data["vectors_file"]))
+                                if "vectors_file" in data.files else self.path)
+
+            if not vectors_path.exists():
+                return False
+            vectors = np.load(vectors_path, mmap_mode="r")
+            if len(vectors) != len(keys):
+                # Keys and matrix from different saves: row i is not key i
+                return False
+
+            self._vectors = vectors
+            self._entries = OrderedDict(
+                (key.decode("ascii"), row) for row, key in enumerate(keys)
+            )
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+            return True
+
+    def save(self):
+        """Write the cache to disk (temp files + rename)"""
+        with self._lock:
+            keys = np.array([key.encode("ascii") for key in self._entries], dtype="S32")
+            if self._entries:
+                vectors = np.stack([self._vector(entry) for entry in self._entries.values()])
+            else:
+                vectors = np.zeros((0, 0), dtype=self.dtype)
+
+            # A new matrix file per save; it only becomes live with the key index
+            vectors_path = self.path.with_name(
+                f"{self.path.stem}.{time.time_ns():x}{os.getpid():x}{self.path.suffix}")
+            tmp_path = vectors_path.with_name(vectors_path.name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, vectors.astype(self.dtype))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, vectors_path)
+
+            tmp_path = self.keys_path.with_name(f"{self.keys_path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.savez(f, keys=keys, model_name=np.array(self.model_name),
+                         vectors_file=np.array(vectors_path.name))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.keys_path)
+
+            # Serve from the new file instead of keeping the vectors in memory
+            self.load()
+            self._remove_stale_files()
+
+    def _vector_files(self):
+        return list(self.path.parent.glob(f"{self.path.stem}.*{self.path.suffix}")) + (
+            [self.path] if self.path.exists() else [])
+
+    def _remove_stale_files(self):
+        """
+        Delete old matrices the key index no longer names
+
+        The key index is read again here: another process may have
+        published its own save since ours. Files still mapped are
+        skipped on Windows.
+        """
+        try:
+            with np.load(self.keys_path, allow_pickle=False) as data:
+                live = (str(data["vectors_file"]) if "vectors_file" in data.files
+                        else self.path.name)
+        except (OSError, ValueError):
+            return
+
+        now = time.time()
+        for path in self._vector_files():
+            if path.name == live:
+                continue
+            try:
+                if now - path.stat().st_mtime > self.stale_after:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        """Empty the cache and delete its files"""
+        with self._lock:
+            self._entries.clear()
+            self._vectors = None
+            for path in self._vector_files() + [self.keys_path]:
+                if path.exists():
+                    os.remove(path)
@@ -0,0 +1,177 @@
+import numpy as np
+from pathlib import Path
+
+
+class TorchEncoder:
+    """Sentence encoder served by PyTorch (sentence-transformers)"""
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.max_seq_length = getattr(self.model, "max_seq_length", 128)
+
+    def encode(self, texts, batch_size=32):
+        """Encode a list of texts into a (n, d) float32 array"""
+        embeddings = self.model.encode(
+            list(texts),
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
+
+class OnnxEncoder:
+    """
+    Sentence encoder served by ONNX Runtime on CPU
+
+    - The transformer is exported once to <export_dir>/<model>/model.onnx
+    - quantize=True adds a dynamically int8-quantized copy (model.int8.onnx)
+    - Mean pooling over the attention mask, as in the sentence-transformers
+      paraphrase-multilingual models, so vectors match the PyTorch backend
+    """
+
+    def __init__(self, model_name, export_dir="onnx_models", quantize=False, max_seq_length=128):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.max_seq_length = max_seq_length
+
+        model_dir = Path(export_dir) / model_name.replace("/", "__")
+        model_path = model_dir / "model.onnx"
+        if not model_path.exists():
+            export_onnx(model_name, model_dir)
+
+        if quantize:
+            quantized_path = model_dir / "model.int8.onnx"
+            if not quantized_path.exists():
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+                print("⚙️ ضغط نموذج ONNX إلى int8...")
+                quantize_dynamic(str(model_path), str(quantized_path),
+                                 weight_type=QuantType.QInt8)
+            model_path = quantized_path
+
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.session = onnxruntime.InferenceSession(
+            str(model_path), providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def encode(self, texts, batch_size=32):
+        """Encode a list of texts into a (n, d) float32 array"""
+        texts = list(texts)
+        batches = []
+
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype(np.int64)
+                     for name in self.input_names if name in encoded}
+            token_embeddings = self.session.run(None, feeds)[0]
+
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            summed = (token_embeddings * mask).sum(axis=1)
+            batches.append(summed / np.clip(mask.sum(axis=1), 1e-9, None))
+
+        if not batches:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(batches).astype(np.float32)
+
+
+def export_onnx(model_name, model_dir):
+    """Export the transformer of a sentence-transformers model to ONNX"""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    print(f"📦 تصدير {model_name} إلى ONNX...")
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.config.return_dict = False
+    model.eval()
+
+    dummy = tokenizer(["نص تجريبي"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids")
+                   if name in dummy]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(dummy[name] for name in input_names),
+            str(model_dir / "model.onnx"),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+
+    tokenizer.save_pretrained(str(model_dir))
+    print(f"✅ تم التصدير: {model_dir}")
+
+
+def create_encoder(model_name, backend="torch", export_dir="onnx_models", quantize=False,
+                   max_seq_length=128):
+    """
+    Create the sentence encoder for RAGSystem
+
+    backend="onnx" falls back to PyTorch if onnxruntime is missing or
+    the export fails.
+    """
+    if backend == "onnx":
+        try:
+            encoder = OnnxEncoder(model_name, export_dir=export_dir, quantize=quantize,
+                                  max_seq_length=max_seq_length)
+            print(f"⚡ ONNX Runtime{' (int8)' if quantize else ''}")
+            return encoder
+        except Exception as e:
+            print(f"⚠️ فشل تشغيل ONNX ({e})، استخدام PyTorch...")
+    elif backend != "torch":
+        raise ValueError(f"Unknown encoder backend: {backend}")
+
+    return TorchEncoder(model_name)
+
+
+def check_parity(model_name, texts, export_dir="onnx_models", quantize=False):
+    """
+    Cosine similarity between PyTorch and ONNX vectors for the same texts
+
+    Returns {"min": ..., "mean": ...}; values close to 1.0 mean the ONNX
+    backend can replace PyTorch without rebuilding the index.
+    """
+    reference = TorchEncoder(model_name)
+    candidate = OnnxEncoder(model_name, export_dir=export_dir, quantize=quantize,
+                            max_seq_length=reference.max_seq_length)
+
+    a = reference.encode(texts)
+    b = candidate.encode(texts)
+    a /= np.linalg.norm(a, axis=1, keepdims=True)
+    b /= np.linalg.norm(b, axis=1, keepdims=True)
+    cosine = (a * b).sum(axis=1)
+
+    result = {"min": float(cosine.min()), "mean": float(cosine.mean())}
+    print(f"📐 تطابق PyTorch / ONNX{' int8' if quantize else ''}: "
+          f"min={result['min']:.4f} mean={result['mean']:.4f}")
+    return result
+
+
+if __name__ == "__main__":
+    sample_texts = [
+        "ما هي الخلية؟",
+        "تتكون الخلية من الغشاء البلازمي والسيتوبلازم والنواة",
+        "مدرسة الديوان من المدارس الادبيه الحديثه",
+        "التكاثر الجنسي واللاجنسي في الكائنات الحيه",
+    ]
+    name = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
+    check_parity(name, sample_texts)
+    check_parity(name, sample_texts, quantize=True)
@@ -0,0 +1,190 @@
+import queue
+import threading
+import time
+from contextlib import closing
+
+from data_extractor import PDFExtractor
+from database_manager import DatabaseManager
+from text_preprocessor import TextPreprocessor
+
+_DONE = object()  # end-of-stream marker passed between stages
+
+
+class _StageError:
+    """An exception raised in a stage thread, forwarded downstream"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+class IngestionPipeline:
+    """
+    🆕 Streaming ingestion: extract → clean → chunk → store → embed → index
+
+    Each book flows through three stages connected by bounded queues:
+    - extraction thread: PDFExtractor.process_pdf_page_by_page
+    - chunking thread: preprocess_text + chunk_text
+    - calling thread: inserts chunks into the database, embeds them in
+      batches of embed_batch_size and appends them to the RAG index
+    A full queue blocks the stage before it (backpressure), so at most
+    page_queue_size pages and chunk_queue_size chunks are in flight
+    whatever the size of the book. The snapshot is written once, at
+    the end, and the bot starts with an index that is already in sync.
+    """
+
+    def __init__(self, rag_system=None, db_manager=None, extractor=None, preprocessor=None,
+                 embed_batch_size=64, page_queue_size=8, chunk_queue_size=256,
+                 chunk_size=800, overlap=100, min_chunk_length=100, pages_per_chapter=20):
+        self.rag_system = rag_system
+        self.db_manager = db_manager or DatabaseManager()
+        self.extractor = extractor or PDFExtractor()
+        self.preprocessor = preprocessor or TextPreprocessor()
+        self.embed_batch_size = embed_batch_size
+        self.page_queue_size = page_queue_size
+        self.chunk_queue_size = chunk_queue_size
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.min_chunk_length = min_chunk_length
+        self.pages_per_chapter = pages_per_chapter
+
+    def _rag(self):
+        if self.rag_system is None:
+            from rag_server import create_rag_system
+            self.rag_system = create_rag_system()
+        return self.rag_system
+
+    @staticmethod
+    def _put(target, item, stop):
+        """Blocking put that gives up once the pipeline is stopping"""
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _extract_stage(self, pdf_path, pages, stop):
+        try:
+            with closing(self.extractor.process_pdf_page_by_page(pdf_path)) as extracted:
+                for page in extracted:
+                    if not self._put(pages, page, stop):
+                        return
+            self._put(pages, _DONE, stop)
+        except Exception as e:
+            self._put(pages, _StageError(e), stop)
+
+    def _chunk_stage(self, subject, pages, chunks, stop):
+        try:
+            while not stop.is_set():
+                try:
+                    item = pages.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE or isinstance(item, _StageError):
+                    self._put(chunks, item, stop)
+                    return
+
+                page_text, page_num = item
+                processed_text = self.preprocessor.preprocess_text(page_text)
+                if not self.preprocessor.is_meaningful_text(processed_text):
+                    continue
+
+                chapter_num = (page_num - 1) // self.pages_per_chapter + 1
+                for chunk in self.preprocessor.chunk_text(
+                        processed_text, chunk_size=self.chunk_size, overlap=self.overlap):
+                    if len(chunk) > self.min_chunk_length:  # Ignore very short texts
+                        row = (subject, "secondary", f"Chapter {chapter_num}", chunk,
+                               page_num, "text")
+                        if not self._put(chunks, row, stop):
+                            return
+        except Exception as e:
+            self._put(chunks, _StageError(e), stop)
+
+    def _index_batch(self, rows, stats):
+        """Store one batch of chunks and append it to the index"""
+        ids = self.db_manager.add_textbook_contents(rows, return_ids=True)
+        texts = [row[3] for row in rows]
+        metadata = [{"subject": row[0], "chapter": row[2], "page": row[4]} for row in rows]
+
+        self._rag().add_texts(texts, metadata, new_ids=ids, save=False)
+
+        stats["chunks"] += len(rows)
+        stats["characters"] += sum(len(text) for text in texts)
+
+    def ingest_pdf(self, pdf_path, subject):
+        """
+        Ingest one book and save the RAG index
+
+        Returns {"chunks", "characters", "seconds"}.
+        """
+        rag = self._rag()
+        start = time.perf_counter()
+        stats = {"chunks": 0, "characters": 0}
+
+        pages = queue.Queue(maxsize=self.page_queue_size)
+        chunks = queue.Queue(maxsize=self.chunk_queue_size)
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=self._extract_stage, args=(pdf_path, pages, stop),
+                             name="ingest-extract", daemon=True),
+            threading.Thread(target=self._chunk_stage, args=(subject, pages, chunks, stop),
+                             name="ingest-chunk", daemon=True)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            batch = []
+            while True:
+                item = chunks.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, _StageError):
+                    raise item.error
+
+                batch.append(item)
+                if len(batch) >= self.embed_batch_size:
+                    self._index_batch(batch, stats)
+                    batch = []
+
+            if batch:
+                self._index_batch(batch, stats)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        if rag.index is not None:
+            if rag.index_outdated():
+                # Indexes created from a first (small) batch are exact:
+                # train the requested type now that the corpus has grown
+                # (the embeddings come from the cache)
+                rag.build_index(rag.texts, rag.metadata, rag.chunk_ids)
+            else:
+                rag._save_cache()
+
+        stats["seconds"] = time.perf_counter() - start
+        return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    import config
+    from config import EXTRACTED_TEXT_DIRECTORY
+    import os
+
+    parser = argparse.ArgumentParser(description="Ingest PDF textbooks into the database and the RAG index")
+    parser.add_argument("pdf")
+    parser.add_argument("subject", choices=["biology", "arabic"])
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    pipeline = IngestionPipeline(
+        extractor=PDFExtractor(
+            workers=getattr(config, "PDF_WORKERS", None),
+            page_cache=os.path.join(EXTRACTED_TEXT_DIRECTORY, "page_cache.db")),
+        embed_batch_size=args.batch_size)
+    result = pipeline.ingest_pdf(args.pdf, args.subject)
+    print(f"✅ {result['chunks']} قطعة، {result['characters']:,} حرف، "
+          f"{result['seconds']:.1f} ثانية")
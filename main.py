@@ -1,10 +1,12 @@
 import os
+import config
 from config import TELEGRAM_TOKEN, PDF_DIRECTORY, EXTRACTED_TEXT_DIRECTORY
 from data_extractor import PDFExtractor
-from text_preprocessor import TextPreprocessor
+from ingestion_pipeline import IngestionPipeline
 from database_manager import DatabaseManager
 from telegram_bot import StudyAssistantBot
 from reminder_system import ReminderSystem
+from rag_storage import SnapshotStore
 
 
 def setup_directories():
@@ -15,8 +17,13 @@ def setup_directories():
     print("✅ تم إنشاء المجلدات\n")
 
 
-def process_single_pdf(pdf_name, subject_name):
-    """Process only one book (Biology or Arabic)"""
+def process_single_pdf(pdf_name, subject_name, pipeline=None):
+    """
+    Process only one book (Biology or Arabic)
+
+    🆕 Pages stream through IngestionPipeline: the chunks are stored and
+    added to the RAG index while the book is still being extracted.
+    """
     pdf_path = os.path.join(PDF_DIRECTORY, pdf_name)
 
     if not os.path.exists(pdf_path):
@@ -27,58 +34,41 @@ def process_single_pdf(pdf_name, subject_name):
     print(f"📚 بدء معالجة كتاب: {subject_name}")
     print("="*70 + "\n")
 
-    preprocessor = TextPreprocessor()
-    db_manager = DatabaseManager()
-    extractor = PDFExtractor()
-
-    processed_chunks = 0
-    total_characters = 0
-
-    for page_text, page_num in extractor.process_pdf_page_by_page(pdf_path):
-
-        # Clean the text
-        processed_text = preprocessor.preprocess_text(page_text)
-
-        if not preprocessor.is_meaningful_text(processed_text):
-            continue
-
-        # Split the text into chunks
-        for chunk in preprocessor.chunk_text(processed_text, chunk_size=800, overlap=100):
-
-            if len(chunk) > 100:  # Ignore very short texts
+    pipeline = pipeline or create_ingestion_pipeline()
+    stats = pipeline.ingest_pdf(pdf_path, subject_name)
 
-                # Divide the chapter based on every 20 pages
-                chapter_num = (page_num - 1) // 20 + 1
-
-                db_manager.add_textbook_content(
-                    subject=subject_name,
-                    grade_level="secondary",
-                    chapter=f"Chapter {chapter_num}",
-                    content=chunk,
-                    page_number=page_num,
-                    content_type="text"
-                )
-
-                processed_chunks += 1
-                total_characters += len(chunk)
+    processed_chunks = stats["chunks"]
+    total_characters = stats["characters"]
 
     print("\n" + "="*70)
     print(f"✅ اكتملت معالجة كتاب: {subject_name}")
     print(f"📊 الإحصائيات:")
-    print(f"   • عدد القطع: {processed_chunks}")
-    print(f"   • إجمالي الأحرف: {total_characters:,}")
+    print(f"   • عدد القطع: {processed_chunks}")
+    print(f"   • إجمالي الأحرف: {total_characters:,}")
     print(
-        f"   • متوسط طول القطعة: {total_characters // max(processed_chunks, 1)} حرف")
+        f"   • متوسط طول القطعة: {total_characters // max(processed_chunks, 1)} حرف")
+    print(f"   • الزمن: {stats['seconds']:.1f} ثانية")
     print("="*70 + "\n")
 
 
+def create_ingestion_pipeline():
+    """🆕 Pipeline shared by all books (one encoder, one index)"""
+    # 🆕 Pages already extracted (and OCRed) are read back from the page cache
+    extractor = PDFExtractor(
+        workers=getattr(config, "PDF_WORKERS", None),  # 🆕 optional setting
+        page_cache=os.path.join(EXTRACTED_TEXT_DIRECTORY, "page_cache.db"))
+    return IngestionPipeline(extractor=extractor)
+
+
 def process_pdfs():
     """Process all PDF files (Biology + Arabic)"""
+    pipeline = create_ingestion_pipeline()
+
     # Process Biology
-    process_single_pdf("biology.pdf", "biology")
+    process_single_pdf("biology.pdf", "biology", pipeline)
 
     # Process Arabic
-    process_single_pdf("arabic.pdf", "arabic")
+    process_single_pdf("arabic.pdf", "arabic", pipeline)
 
 
 def verify_database():
@@ -105,16 +95,25 @@ def verify_database():
         else:
             print(f"⚠️ لا يوجد محتوى في قاعدة البيانات لمادة {subject}!\n")
 
+    # 🆕 Hot queries must be answered from their indexes
+    problems = db_manager.verify_query_plans()
+    if problems:
+        for name, plan in problems.items():
+            print(f"⚠️ الاستعلام {name} لا يستخدم الفهرس: {plan}")
+    else:
+        print(f"✅ خطط الاستعلامات تستخدم الفهارس (إصدار المخطط {db_manager.schema_version()})")
+
     print("="*70 + "\n")
 
 
 def check_cache_status():
     """🆕 Check cache status"""
+    snapshot_dir = SnapshotStore("rag_cache").current() or "rag_cache"
     cache_files = [
-        "rag_cache/faiss_index.bin",
-        "rag_cache/texts.pkl",
-        "rag_cache/metadata.pkl",
-        "rag_cache/embeddings_cache.pkl"
+        os.path.join(snapshot_dir, "faiss_index.bin"),
+        os.path.join(snapshot_dir, "texts.bin"),
+        os.path.join(snapshot_dir, "metadata.json"),
+        "rag_cache/embeddings_cache_keys.npz"
     ]
 
     all_exist = all(os.path.exists(f) for f in cache_files)
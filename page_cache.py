@@ -0,0 +1,74 @@
+import hashlib
+import json
+import sqlite3
+import threading
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Stable digest of a file's content"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def settings_digest(settings):
+    """Stable digest of a dict of extraction settings"""
+    data = json.dumps(settings, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class PageCache:
+    """
+    Persistent cache of extracted page text
+
+    - Keyed by (PDF content digest, page number, settings digest), so a
+      renamed PDF still hits and a changed PDF or extractor setting misses
+    - One SQLite file; every page is committed as soon as it is stored,
+      so a crashed ingestion resumes from the pages already done
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS pages (
+            pdf_digest TEXT,
+            page_number INTEGER,
+            settings TEXT,
+            text TEXT,
+            PRIMARY KEY (pdf_digest, page_number, settings)
+        ) WITHOUT ROWID
+        ''')
+        self._conn.commit()
+
+    def get_pages(self, pdf_digest, settings):
+        """All cached pages of one PDF: {page_number: text}"""
+        with self._lock:
+            rows = self._conn.execute('''
+            SELECT page_number, text FROM pages
+            WHERE pdf_digest = ? AND settings = ?
+            ''', (pdf_digest, settings)).fetchall()
+        return dict(rows)
+
+    def put(self, pdf_digest, page_number, settings, text):
+        with self._lock:
+            self._conn.execute('''
+            INSERT OR REPLACE INTO pages (pdf_digest, page_number, settings, text)
+            VALUES (?, ?, ?, ?)
+            ''', (pdf_digest, page_number, settings, text))
+            self._conn.commit()
+
+    def clear(self, pdf_digest=None):
+        """Delete the cached pages of one PDF, or of all PDFs"""
+        with self._lock:
+            if pdf_digest is None:
+                self._conn.execute('DELETE FROM pages')
+            else:
+                self._conn.execute('DELETE FROM pages WHERE pdf_digest = ?', (pdf_digest,))
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,285 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_QUERIES = "benchmark_queries.json"
+DEFAULT_CONFIGS = ["flat", "flat-fp16", "flat-int8", "ivf_flat", "ivf_pq", "hnsw"]
+SUBJECTS = ["biology", "arabic"]
+
+
+def _normalize(text, preprocessor):
+    return " ".join(preprocessor.clean_text(text).split())
+
+
+def label_queries(queries_path=DEFAULT_QUERIES, db_path="study_assistant.db"):
+    """
+    Fill relevant_ids: chunks of the query's subject whose cleaned text
+    contains one of its relevant_phrases
+    """
+    from database_manager import DatabaseManager
+    from text_preprocessor import TextPreprocessor
+
+    preprocessor = TextPreprocessor()
+    rows = DatabaseManager(db_path).get_textbook_rows(SUBJECTS)
+    chunks = [(row_id, subject, _normalize(content, preprocessor))
+              for row_id, subject, _, content, _ in rows]
+
+    with open(queries_path, "r", encoding="utf-8") as f:
+        query_set = json.load(f)
+
+    for entry in query_set["queries"]:
+        phrases = [_normalize(phrase, preprocessor) for phrase in entry["relevant_phrases"]]
+        entry["relevant_ids"] = [
+            row_id for row_id, subject, text in chunks
+            if subject == entry["subject"] and any(phrase in text for phrase in phrases)
+        ]
+        print(f"🏷️ {entry['query']}: {len(entry['relevant_ids'])} قطعة")
+
+    tmp_path = queries_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(query_set, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, queries_path)
+    return query_set
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process in MB (None if unknown)"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)  # Windows
+    except (ImportError, AttributeError):
+        return None
+
+
+def _parse_config(name):
+    """"hnsw-int8" -> ("hnsw", "int8")"""
+    index_type, _, quantization = name.partition("-")
+    return index_type, quantization or None
+
+
+def _labelled_queries(queries_path):
+    """Queries with at least one relevant chunk (ValueError if there are none)"""
+    with open(queries_path, "r", encoding="utf-8") as f:
+        queries = [entry for entry in json.load(f)["queries"] if entry.get("relevant_ids")]
+
+    if not queries:
+        raise ValueError(f"No labelled queries in {queries_path}: "
+                         f"run `python rag_benchmark.py label` first")
+    return queries
+
+
+def run_config(name, model_dir, queries_path, db_path, work_dir, ks, min_score,
+               min_ann_size, method):
+    """Build one configuration and measure it (runs in a child process)"""
+    from rag_system import RAGSystem
+    from database_manager import DatabaseManager
+    from embedding_cache import EmbeddingCache
+
+    index_type, quantization = _parse_config(name)
+    work_dir = Path(work_dir)
+
+    queries = _labelled_queries(queries_path)
+
+    rows = DatabaseManager(db_path).get_textbook_rows(SUBJECTS)
+    ids = [row[0] for row in rows]
+    texts = [row[3] for row in rows]
+    metadata = [{"subject": row[1], "chapter": row[2], "page": row[4]} for row in rows]
+
+    rag = RAGSystem(model_name=str(model_dir), cache_dir=str(work_dir / name),
+                    index_type=index_type, quantization=quantization,
+                    min_ann_size=min_ann_size)
+
+    # One embeddings cache for all configurations
+    rag.embeddings_cache = EmbeddingCache(work_dir / "embeddings_cache.npy",
+                                          rag.embeddings_cache.model_name,
+                                          max_entries=max(len(texts), 1))
+    rag.embeddings_cache.load()
+
+    start = time.perf_counter()
+    rag.embed_texts(texts, show_progress=True)
+    encode_seconds = time.perf_counter() - start
+    rag.embeddings_cache.save()
+
+    start = time.perf_counter()
+    rag.build_index(texts, metadata, ids=ids)
+    build_seconds = time.perf_counter() - start
+
+    index_files = list(rag.snapshot_dir.glob("faiss_index*.bin"))
+    index_bytes = sum(path.stat().st_size for path in index_files
+                      if path.name == "faiss_index.bin")
+    subject_index_bytes = sum(path.stat().st_size for path in index_files
+                              if path.name != "faiss_index.bin")
+
+    search = rag.hybrid_search if method == "hybrid" else rag.search
+    max_k = max(ks)
+    search(queries[0]["query"], k=max_k)  # warm-up
+
+    latencies = []
+    recalls = {k: [] for k in ks}
+    reciprocal_ranks = []
+
+    for entry in queries:
+        rag.result_cache.clear()
+        rag.query_embedding_cache.clear()
+
+        start = time.perf_counter()
+        results = search(entry["query"], k=max_k, min_score=min_score,
+                         subject_filter=entry.get("subject"))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        relevant = set(entry["relevant_ids"])
+        ranked = [result["id"] for result in results]
+        for k in ks:
+            recalls[k].append(len(relevant & set(ranked[:k])) / len(relevant))
+        reciprocal_ranks.append(next(
+            (1 / rank for rank, chunk_id in enumerate(ranked, 1) if chunk_id in relevant), 0.0))
+
+    latencies = np.array(latencies)
+
+    return {
+        "config": name,
+        "index_type": index_type,
+        "quantization": quantization,
+        "method": method,
+        "chunks": len(texts),
+        "queries": len(queries),
+        "encode_seconds": encode_seconds,
+        "build_seconds": build_seconds,
+        "index_bytes": index_bytes,
+        "subject_index_bytes": subject_index_bytes,
+        "recall": {f"@{k}": float(np.mean(recalls[k])) for k in ks},
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "latency_ms": {
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "p99": float(np.percentile(latencies, 99)),
+            "mean": float(latencies.mean())
+        },
+        "peak_rss_mb": _peak_rss_mb()
+    }
+
+
+def run_benchmark(model_dir, configs=None, queries_path=DEFAULT_QUERIES,
+                  db_path="study_assistant.db", output=None, ks=(1, 3, 5, 10),
+                  min_score=0.25, min_ann_size=0, method="search", work_dir=None):
+    """
+    Run every configuration in a fresh process and collect the results
+
+    Separate processes keep build time, index size and peak RSS of one
+    configuration from leaking into the next. Embeddings are shared
+    through one embeddings cache in work_dir, so only the first
+    configuration pays for encoding the corpus (encode_seconds).
+    Hugging Face downloads are disabled: model_dir must be a local copy.
+
+    min_ann_size=0 builds the requested index type even for a small
+    corpus (RAGSystem would fall back to flat below 5,000 chunks).
+    """
+    configs = configs or DEFAULT_CONFIGS
+    _labelled_queries(queries_path)  # fail before building any index
+    work_dir = Path(work_dir or tempfile.mkdtemp(prefix="rag_benchmark_"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "model_dir": str(model_dir),
+        "query_set": str(queries_path),
+        "ks": list(ks),
+        "min_score": min_score,
+        "results": []
+    }
+
+    for name in configs:
+        print(f"\n📐 قياس {name}...")
+        result_path = work_dir / f"{name}.json"
+        args = {
+            "name": name, "model_dir": str(model_dir), "queries_path": str(queries_path),
+            "db_path": db_path, "work_dir": str(work_dir), "ks": list(ks),
+            "min_score": min_score, "min_ann_size": min_ann_size, "method": method
+        }
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "_config", json.dumps(args),
+             str(result_path)],
+            env=dict(os.environ, HF_HUB_OFFLINE="1", TRANSFORMERS_OFFLINE="1"))
+
+        if completed.returncode != 0 or not result_path.exists():
+            print(f"❌ فشل قياس {name}")
+            report["results"].append({"config": name, "error": completed.returncode})
+            continue
+
+        with open(result_path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+        report["results"].append(result)
+
+        recall = " ".join(f"R{k}={v:.3f}" for k, v in result["recall"].items())
+        print(f"✅ {name}: {recall} MRR={result['mrr']:.3f} "
+              f"p95={result['latency_ms']['p95']:.1f} ms "
+              f"build={result['build_seconds']:.1f} s "
+              f"index={result['index_bytes'] / (1024 * 1024):.2f} MB "
+              f"RSS={result['peak_rss_mb'] or 0:.0f} MB")
+
+    if output:
+        tmp_path = output + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, output)
+        print(f"\n📁 النتائج: {output}")
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAGSystem retrieval benchmark")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    label = subparsers.add_parser("label", help="fill relevant_ids from the database")
+    label.add_argument("--queries", default=DEFAULT_QUERIES)
+    label.add_argument("--db", default="study_assistant.db")
+
+    run = subparsers.add_parser("run", help="benchmark index configurations")
+    run.add_argument("--model-dir", required=True,
+                     help="local sentence-transformers model directory (no downloads)")
+    run.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS,
+                     help="index_type[-quantization], e.g. flat hnsw-int8")
+    run.add_argument("--queries", default=DEFAULT_QUERIES)
+    run.add_argument("--db", default="study_assistant.db")
+    run.add_argument("--output", default="benchmark_results.json")
+    run.add_argument("--k", nargs="+", type=int, default=[1, 3, 5, 10])
+    run.add_argument("--min-score", type=float, default=0.25)
+    run.add_argument("--min-ann-size", type=int, default=0)
+    run.add_argument("--method", choices=["search", "hybrid"], default="search")
+    run.add_argument("--work-dir", default=None)
+
+    config = subparsers.add_parser("_config")  # internal: one configuration per process
+    config.add_argument("args")
+    config.add_argument("result_path")
+
+    args = parser.parse_args()
+
+    if args.command == "label":
+        label_queries(args.queries, args.db)
+    elif args.command == "run":
+        run_benchmark(args.model_dir, args.configs, args.queries, args.db, args.output,
+                      tuple(args.k), args.min_score, args.min_ann_size, args.method,
+                      args.work_dir)
+    else:
+        result = run_config(**json.loads(args.args))
+        with open(args.result_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+import json
+import os
+import re
+import select
+import socket
+import socketserver
+import struct
+import threading
+
+import numpy as np
+
+from rag_system import RAGSystem
+from search_batcher import SearchBatcher
+
+
+# Methods a client may call, and those that change the index
+READ_METHODS = {
+    "search", "search_with_quality_filter", "search_with_keywords", "hybrid_search",
+    "embed_text", "embed_texts", "get_stats"
+}
+WRITE_METHODS = {"sync_index", "add_texts", "remove_ids", "set_search_params"}
+BATCHED_METHODS = {"search", "search_with_quality_filter"}
+
+_HEADER = struct.Struct(">I")  # 4-byte big-endian length before every JSON message
+MAX_MESSAGE_SIZE = 256 * 1024 * 1024
+
+
+def create_rag_system():
+    """
+    RAGSystem configured from config.py (shared by the bot and the server)
+
+    Settings missing from an older config.py keep the defaults of
+    config.example.py.
+    """
+    import config
+
+    return RAGSystem(
+        index_type=getattr(config, "RAG_INDEX_TYPE", "flat"),
+        nprobe=getattr(config, "RAG_NPROBE", 16),
+        ef_search=getattr(config, "RAG_EF_SEARCH", 64),
+        quantization=getattr(config, "RAG_QUANTIZATION", None),
+        encoder_backend=getattr(config, "RAG_ENCODER_BACKEND", "torch"),
+        onnx_quantize=getattr(config, "RAG_ONNX_QUANTIZE", False),
+        mmr_lambda=getattr(config, "RAG_MMR_LAMBDA", 0.7),
+        reranker_model=getattr(config, "RAG_RERANKER_MODEL", None),
+        rerank_top_n=getattr(config, "RAG_RERANK_TOP_N", 20),
+        rerank_budget_ms=getattr(config, "RAG_RERANK_BUDGET_MS", 150))
+
+
+def _parse_address(address):
+    """
+    "host:port" -> TCP (for Windows, which has no Unix sockets in Python),
+    anything else -> path of a Unix domain socket
+    """
+    match = re.fullmatch(r"([\w.\-]+):(\d+)", address)
+    if match:
+        return socket.AF_INET, (match.group(1), int(match.group(2)))
+    return socket.AF_UNIX, address
+
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _send_message(sock, payload):
+    data = json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv_message(sock):
+    """Next JSON message, or None when the peer closed the connection"""
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+
+    (size,) = _HEADER.unpack(header)
+    if size > MAX_MESSAGE_SIZE:
+        raise ConnectionError(f"message too large ({size} bytes)")
+
+    data = _recv_exact(sock, size)
+    if data is None:
+        return None
+    return json.loads(data.decode("utf-8"))
+
+
+class _ReadWriteLock:
+    """
+    Many concurrent searches, or one index update at a time
+
+    A queued update holds back new searches, so a steady stream of
+    them cannot delay it forever.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._condition:
+            while self._writing or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            try:
+                while self._writing or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writing = True
+
+    def release_write(self):
+        with self._condition:
+            self._writing = False
+            self._condition.notify_all()
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    """One client connection: answers requests until the client disconnects"""
+
+    def handle(self):
+        while True:
+            try:
+                request = _recv_message(self.request)
+            except (OSError, ValueError):
+                return
+            if request is None:
+                return
+
+            response = self.server.rag_server.dispatch(request)
+            try:
+                _send_message(self.request, response)
+            except OSError:
+                return
+
+
+class RAGServer:
+    """
+    🆕 Local search server that owns one RAGSystem
+
+    Several bot processes on the same host share one encoder and one
+    FAISS index through RAGClient, instead of loading ~1 GB each.
+
+    - address: Unix socket path (e.g. "/tmp/study_bot_rag.sock"), or
+      "127.0.0.1:8765" where Unix sockets are not available
+    - Messages are length-prefixed JSON (no pickle), one thread per client
+    - Searches run in parallel; sync_index/add_texts/remove_ids wait for
+      running searches and block new ones until they finish
+    - Concurrent searches from all clients are micro-batched
+      (max_wait_ms = 0 turns batching off)
+    """
+
+    def __init__(self, address, rag_system=None, max_batch_size=32, max_wait_ms=5):
+        self.address = address
+        self.rag_system = rag_system if rag_system is not None else create_rag_system()
+        self._lock = _ReadWriteLock()
+        self._batcher = (SearchBatcher(self.rag_system, max_batch_size, max_wait_ms)
+                         if max_wait_ms else None)
+
+        family, server_address = _parse_address(address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(server_address):
+                os.remove(server_address)  # stale socket from a previous run
+            server_class = socketserver.ThreadingUnixStreamServer
+        else:
+            server_class = socketserver.ThreadingTCPServer
+            server_class.allow_reuse_address = True
+
+        self._server = server_class(server_address, _RequestHandler)
+        self._server.daemon_threads = True
+        self._server.rag_server = self
+
+        if family == socket.AF_UNIX:
+            os.chmod(server_address, 0o600)  # only the bot's user may connect
+
+    def dispatch(self, request):
+        """Run one request: {"method", "args", "kwargs"} -> {"result"} or {"error"}"""
+        method = request.get("method") if isinstance(request, dict) else None
+        if method not in READ_METHODS and method not in WRITE_METHODS:
+            return {"error": f"Unknown method: {method}"}
+
+        args = request.get("args") or []
+        kwargs = request.get("kwargs") or {}
+        writing = method in WRITE_METHODS
+
+        target = self.rag_system
+        if self._batcher is not None and method in BATCHED_METHODS:
+            target = self._batcher
+
+        if writing:
+            self._lock.acquire_write()
+        else:
+            self._lock.acquire_read()
+        try:
+            return {"result": getattr(target, method)(*args, **kwargs)}
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            if writing:
+                self._lock.release_write()
+            else:
+                self._lock.release_read()
+
+    def serve_forever(self):
+        print(f"🛰️ خادم البحث يعمل على {self.address}")
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """Stop serve_forever (from another thread) and close the socket"""
+        self._server.shutdown()
+        self.close()
+
+    def close(self):
+        self._server.server_close()
+        if self._batcher is not None:
+            self._batcher.close()
+        family, server_address = _parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(server_address):
+            os.remove(server_address)
+
+
+class RAGClient:
+    """
+    🆕 Thin client for RAGServer with the same interface as RAGSystem
+
+    Each thread keeps its own connection, reconnecting if the server
+    was restarted. A request is only sent again when it never left the
+    client: once sent, a lost connection or a timeout is raised rather
+    than risk applying an index update twice. Errors raised on the
+    server are re-raised here as RuntimeError.
+
+    timeout (seconds) applies to searches and other reads;
+    write_timeout to sync_index/add_texts/remove_ids/set_search_params,
+    which can take minutes on a first build (None = wait for them).
+    """
+
+    def __init__(self, address, timeout=60, write_timeout=None):
+        self.address = address
+        self.timeout = timeout
+        self.write_timeout = write_timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None and select.select([sock], [], [], 0)[0]:
+            # The server never speaks first: a readable idle connection
+            # was closed on the other side (server restarted)
+            self._disconnect()
+            sock = None
+        if sock is None:
+            family, server_address = _parse_address(self.address)
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(server_address)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _disconnect(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _call(self, method, *args, **kwargs):
+        request = {"method": method, "args": list(args), "kwargs": kwargs}
+
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                sock.settimeout(self.write_timeout if method in WRITE_METHODS
+                                else self.timeout)
+                _send_message(sock, request)
+                break
+            except OSError:
+                # Not sent (or not completely): safe to retry on a new connection
+                self._disconnect()
+                if attempt:
+                    raise
+
+        try:
+            response = _recv_message(sock)
+        except OSError:
+            self._disconnect()  # a late response must not answer the next request
+            raise
+        if response is None:
+            self._disconnect()
+            raise ConnectionError("search server closed the connection")
+
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    def search(self, query, k=5, min_score=0.4, subject_filter=None):
+        return self._call("search", query, k=k, min_score=min_score,
+                          subject_filter=subject_filter)
+
+    def search_with_quality_filter(self, query, k=5, min_quality=0.3, subject_filter=None):
+        return self._call("search_with_quality_filter", query, k=k, min_quality=min_quality,
+                          subject_filter=subject_filter)
+
+    def search_with_keywords(self, query, k=5, subject_filter=None):
+        return self._call("search_with_keywords", query, k=k, subject_filter=subject_filter)
+
+    def hybrid_search(self, query, k=5, min_score=0.3, subject_filter=None, rrf_k=60):
+        return self._call("hybrid_search", query, k=k, min_score=min_score,
+                          subject_filter=subject_filter, rrf_k=rrf_k)
+
+    def embed_text(self, text):
+        return np.array(self._call("embed_text", text), dtype=np.float32)
+
+    def embed_texts(self, texts, batch_size=None, show_progress=False):
+        embeddings = self._call("embed_texts", list(texts), batch_size=batch_size,
+                                show_progress=show_progress)
+        return np.array(embeddings, dtype=np.float32)
+
+    def sync_index(self, ids, texts, metadata):
+        return self._call("sync_index", list(ids), list(texts), list(metadata))
+
+    def add_texts(self, new_texts, new_metadata, new_ids=None, save=True):
+        return self._call("add_texts", list(new_texts), list(new_metadata),
+                          new_ids=list(new_ids) if new_ids is not None else None, save=save)
+
+    def remove_ids(self, ids, save=True):
+        return self._call("remove_ids", list(ids), save=save)
+
+    def set_search_params(self, nprobe=None, ef_search=None):
+        return self._call("set_search_params", nprobe=nprobe, ef_search=ef_search)
+
+    def get_stats(self):
+        return self._call("get_stats")
+
+    def close(self):
+        self._disconnect()
+
+
+if __name__ == "__main__":
+    import sys
+    import config
+
+    server = RAGServer(sys.argv[1] if len(sys.argv) > 1
+                       else getattr(config, "RAG_SERVER_ADDRESS", None) or "/tmp/study_bot_rag.sock",
+                       max_batch_size=getattr(config, "RAG_MAX_BATCH_SIZE", 32),
+                       max_wait_ms=getattr(config, "RAG_BATCH_WAIT_MS", 5))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 إيقاف خادم البحث")
+    finally:
+        server.close()
@@ -0,0 +1,286 @@
+import json
+import mmap
+import os
+import shutil
+import time
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+
+
+def _save_npy(path, array):
+    """Write a .npy file through a temp file + rename (safe for mapped readers)"""
+    tmp_path = Path(str(path) + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+class MappedTexts(Sequence):
+    """
+    Read-only list of texts backed by memory-mapped files
+
+    - texts.bin: all texts as one UTF-8 blob
+    - texts_offsets.npy: int64 offsets, text i is blob[offsets[i]:offsets[i+1]]
+
+    Processes that map the same files share the pages through the OS
+    page cache, and opening costs the same whatever the corpus size.
+    """
+
+    def __init__(self, blob_path, offsets_path):
+        self._offsets = np.load(offsets_path, mmap_mode="r")
+        self._blob = b""
+
+        if os.path.getsize(blob_path) > 0:
+            with open(blob_path, "rb") as f:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("text index out of range")
+
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._blob[start:end].decode("utf-8")
+
+    @staticmethod
+    def write(texts, blob_path, offsets_path):
+        """Write texts in the mapped layout"""
+        offsets = [0]
+        tmp_path = Path(str(blob_path) + ".tmp")
+
+        with open(tmp_path, "wb") as f:
+            for text in texts:
+                data = text.encode("utf-8")
+                f.write(data)
+                offsets.append(offsets[-1] + len(data))
+
+        os.replace(tmp_path, blob_path)
+        _save_npy(offsets_path, np.array(offsets, dtype="int64"))
+
+
+class ColumnarMetadata(Sequence):
+    """
+    Read-only list of metadata dicts stored column by column
+
+    - <prefix>.json: row count and column schema
+    - <prefix>_<column>.npy: one memory-mapped array per column
+
+    Integer columns are stored as int64. Any other column is stored as
+    int32 codes into a list of categories kept in the schema, which fits
+    values like subject and chapter that repeat across many chunks.
+    """
+
+    def __init__(self, directory, prefix="metadata"):
+        directory = Path(directory)
+        with open(directory / f"{prefix}.json", "r", encoding="utf-8") as f:
+            schema = json.load(f)
+
+        self._count = schema["count"]
+        self._columns = {}
+        for name, column in schema["columns"].items():
+            values = np.load(directory / f"{prefix}_{name}.npy", mmap_mode="r")
+            self._columns[name] = (values, column.get("categories"))
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("metadata index out of range")
+
+        row = {}
+        for name, (values, categories) in self._columns.items():
+            if categories is None:
+                row[name] = int(values[i])
+            else:
+                row[name] = categories[values[i]]
+        return row
+
+    def categories(self, name):
+        """Distinct values of a categorical column"""
+        return list(self._columns[name][1] or [])
+
+    def column(self, name):
+        """Raw column array (codes for categorical columns)"""
+        return self._columns[name][0]
+
+    @staticmethod
+    def write(metadata, directory, prefix="metadata"):
+        """Write a list of metadata dicts in the columnar layout"""
+        directory = Path(directory)
+
+        names = []
+        for row in metadata:
+            for name in row:
+                if name not in names:
+                    names.append(name)
+
+        schema = {"count": len(metadata), "columns": {}}
+
+        for name in names:
+            values = [row.get(name) for row in metadata]
+
+            if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool)
+                   for v in values):
+                array = np.array(values, dtype="int64")
+                schema["columns"][name] = {"kind": "int"}
+            else:
+                categories = []
+                codes_by_value = {}
+                codes = []
+                for value in values:
+                    if value not in codes_by_value:
+                        codes_by_value[value] = len(categories)
+                        categories.append(value)
+                    codes.append(codes_by_value[value])
+
+                array = np.array(codes, dtype="int32")
+                schema["columns"][name] = {
+                    "kind": "category", "categories": categories}
+
+            _save_npy(directory / f"{prefix}_{name}.npy", array)
+
+        tmp_path = directory / f"{prefix}.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(schema, f, ensure_ascii=False)
+        os.replace(tmp_path, directory / f"{prefix}.json")
+
+
+def _fsync_path(path):
+    """Flush a file (or a directory entry, where the OS allows it) to disk"""
+    flags = os.O_RDONLY
+    if os.path.isdir(path):
+        flags |= getattr(os, "O_DIRECTORY", 0)
+    try:
+        fd = os.open(path, flags)
+    except OSError:
+        return  # Windows cannot open directories
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class SnapshotStore:
+    """
+    Versioned, immutable snapshots of the RAG cache
+
+    - <root>/snapshots/v000001, v000002, ...: one directory per version
+    - <root>/CURRENT: JSON manifest naming the live version
+
+    A new version is written into a temp directory, fsynced, renamed
+    into place and only then published by replacing CURRENT. Readers
+    open the version named in CURRENT once and keep using it, so they
+    never see files from two different saves. A crash mid-save leaves
+    the previous version live.
+    """
+
+    def __init__(self, root, keep=3):
+        self.root = Path(root)
+        self.snapshots_dir = self.root / "snapshots"
+        self.manifest_path = self.root / "CURRENT"
+        self.keep = keep
+
+    def manifest(self):
+        """Manifest of the live version (the info passed to commit + "version"), or None"""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        return manifest if (self.snapshots_dir / manifest["version"]).is_dir() else None
+
+    def current(self):
+        """Directory of the live version, or None"""
+        manifest = self.manifest()
+        return self.snapshots_dir / manifest["version"] if manifest else None
+
+    def _versions(self):
+        if not self.snapshots_dir.exists():
+            return []
+        return sorted(path.name for path in self.snapshots_dir.iterdir()
+                      if path.is_dir() and path.name.startswith("v") and path.name[1:].isdigit())
+
+    def begin(self):
+        """Empty temp directory to write the next version into"""
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+        tmp_dir = self.snapshots_dir / f".tmp-{os.getpid()}-{os.urandom(4).hex()}"
+        tmp_dir.mkdir()
+        return tmp_dir
+
+    def commit(self, tmp_dir, info=None):
+        """Fsync, rename the temp directory to the next version and publish it"""
+        tmp_dir = Path(tmp_dir)
+        for path in tmp_dir.iterdir():
+            _fsync_path(path)
+        _fsync_path(tmp_dir)
+
+        while True:
+            versions = self._versions()
+            number = int(versions[-1][1:]) + 1 if versions else 1
+            directory = self.snapshots_dir / f"v{number:06d}"
+            try:
+                os.rename(tmp_dir, directory)
+                break
+            except OSError:
+                if not directory.exists():
+                    raise
+                # Another process took this version number first
+        _fsync_path(self.snapshots_dir)
+
+        manifest = dict(info or {}, version=directory.name)
+        tmp_path = self.manifest_path.with_name("CURRENT.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        _fsync_path(self.root)
+
+        self.prune()
+        return directory
+
+    def abort(self, tmp_dir):
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def prune(self):
+        """
+        Delete all but the newest `keep` versions and stale temp directories
+
+        Processes still reading an old version keep their open/mapped
+        files on POSIX; where the OS refuses (Windows), the directory is
+        left for a later prune.
+        """
+        current = self.current()
+        for name in self._versions()[:-self.keep or None]:
+            directory = self.snapshots_dir / name
+            if directory != current:
+                shutil.rmtree(directory, ignore_errors=True)
+
+        # Leftovers of saves that crashed (an hour is far longer than a save)
+        for path in self.snapshots_dir.glob(".tmp-*"):
+            if time.time() - path.stat().st_mtime > 3600:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def clear(self):
+        """Delete every version and the manifest"""
+        if self.manifest_path.exists():
+            os.remove(self.manifest_path)
+        shutil.rmtree(self.snapshots_dir, ignore_errors=True)
@@ -1,14 +1,27 @@
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
 import re
-import pickle
 import os
+import hashlib
+import json
+import copy
 from pathlib import Path
+from embedding_cache import EmbeddingCache
+from rag_storage import MappedTexts, ColumnarMetadata, SnapshotStore
+from chunk_features import ChunkFeatures, extract_keywords
+from query_cache import LRUCache
+from encoder_backend import create_encoder
+from reranker import CrossEncoderReranker
 
 
 class RAGSystem:
-    def __init__(self, model_name="sentence-transformers/paraphrase-multilingual-mpnet-base-v2", cache_dir="rag_cache"):
+    def __init__(self, model_name="sentence-transformers/paraphrase-multilingual-mpnet-base-v2", cache_dir="rag_cache",
+                 batch_size=32, max_cached_embeddings=100000, index_type="flat", nlist=None,
+                 nprobe=16, pq_m=16, hnsw_m=32, ef_search=64, min_ann_size=5000,
+                 quantization=None, encoder_backend="torch", onnx_quantize=False,
+                 use_mmap=True, query_cache_size=1024, result_cache_size=512, result_cache_ttl=3600,
+                 keep_snapshots=3, mmr_lambda=0.7, reranker_model=None, rerank_top_n=20,
+                 rerank_budget_ms=150):
         """
         Professional RAG system using Sentence Transformers with caching
 
@@ -21,6 +34,34 @@ class RAGSystem:
         - Save embeddings to disk
         - Load cache instead of re-processing
         - Saves time on every run
+        - Batched embedding generation (batch_size texts per forward pass)
+        - Content-addressed embeddings cache that survives restarts
+        - Approximate search indexes (index_type):
+            "flat"     exact search (default)
+            "ivf_flat" inverted lists, tuned with nprobe
+            "ivf_pq"   inverted lists + product quantization (pq_m sub-vectors)
+            "hnsw"     graph index, tuned with ef_search
+          Corpora smaller than min_ann_size always use "flat"
+        - Scalar quantization (quantization="fp16" or "int8") to cut index
+          memory 2-4x, see quantization_report
+        - One sub-index per subject (plus the global index), so
+          subject-filtered searches only scan that subject
+        - Memory-mapped cache (use_mmap): indexes, texts, metadata and
+          cached embeddings are mapped instead of copied into each process
+        - Every vector is labelled with its chunk id (textbook_content.id),
+          so sync_index only embeds/removes the rows that changed
+        - Result quality features are precomputed per chunk at index time
+        - LRU caches for query embeddings and ranked results; the result
+          cache expires after result_cache_ttl seconds and is cleared
+          whenever the index changes
+        - Pluggable encoder (encoder_backend): "torch" (sentence-transformers)
+          or "onnx" (ONNX Runtime, optionally int8 with onnx_quantize)
+        - Every save writes a new versioned snapshot directory and switches
+          to it atomically (the last keep_snapshots versions are kept)
+        - Maximal marginal relevance (mmr_lambda) keeps overlapping chunks
+          from filling the top results; None turns it off
+        - Optional cross-encoder reranking (reranker_model) of the
+          rerank_top_n best candidates within rerank_budget_ms per query
         """
         print("\n" + "="*70)
         print("🔧 تحميل نموذج RAG...")
@@ -28,56 +69,148 @@ class RAGSystem:
 
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
+        self.batch_size = batch_size
+
+        # Index settings
+        self.index_type = index_type
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+        self.min_ann_size = min_ann_size
+        self.quantization = quantization
+        self.use_mmap = use_mmap
+        self.mmr_lambda = mmr_lambda
 
         # Cache file paths
-        self.index_path = self.cache_dir / "faiss_index.bin"
-        self.texts_path = self.cache_dir / "texts.pkl"
-        self.metadata_path = self.cache_dir / "metadata.pkl"
-        self.embeddings_cache_path = self.cache_dir / "embeddings_cache.pkl"
+        self.snapshots = SnapshotStore(self.cache_dir, keep=keep_snapshots)
+        self._set_snapshot_dir(self.snapshots.current() or self.cache_dir)
+        self.embeddings_cache_path = self.cache_dir / "embeddings_cache.npy"
 
         try:
-            self.model = SentenceTransformer(model_name)
+            self.model = create_encoder(
+                model_name, backend=encoder_backend, quantize=onnx_quantize)
             print("✅ تم تحميل الموديل بنجاح!")
         except Exception as e:
             print(f"⚠️ فشل تحميل الموديل الأساسي، استخدام بديل...")
-            self.model = SentenceTransformer(
-                "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+            model_name = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+            self.model = create_encoder(
+                model_name, backend=encoder_backend, quantize=onnx_quantize)
             print("✅ تم تحميل الموديل البديل")
 
+        self.model_name = model_name
+
+        self.reranker = None
+        if reranker_model:
+            try:
+                self.reranker = CrossEncoderReranker(
+                    reranker_model, top_n=rerank_top_n, time_budget_ms=rerank_budget_ms)
+                print(f"✅ تم تحميل نموذج إعادة الترتيب: {reranker_model}")
+            except Exception as e:
+                print(f"⚠️ فشل تحميل نموذج إعادة الترتيب ({e})، المتابعة بدونه...")
+
         print("="*70 + "\n")
 
         self.index = None
+        self.subject_indexes = {}
         self.texts = []
         self.metadata = []
-        self.embeddings_cache = {}
+        self.chunk_ids = []  # chunk id of each position in texts/metadata
+        self.chunk_hashes = []  # content + metadata digest of each position
+        self.id_to_position = {}
+        self.features = ChunkFeatures()
+        self._subject_masks = {}
+        self._mapped = False  # True while serving read-only mapped data
+        self.query_embedding_cache = LRUCache(maxsize=query_cache_size)
+        self.result_cache = LRUCache(maxsize=result_cache_size, ttl=result_cache_ttl)
+        # int8 ONNX vectors differ slightly from float ones: keep them apart
+        cache_model_name = self.model_name + ("#onnx-int8" if encoder_backend == "onnx" and onnx_quantize else "")
+        self.embeddings_cache = EmbeddingCache(
+            self.embeddings_cache_path, cache_model_name, max_entries=max_cached_embeddings)
+        try:
+            self.embeddings_cache.load()
+        except Exception as e:
+            print(f"⚠️ فشل تحميل embeddings cache: {e}")
 
         # 🆕 Attempt to load existing cache
         self._load_cache()
 
+    def _set_snapshot_dir(self, directory):
+        """
+        Point the cache file paths at one snapshot directory
+
+        The embeddings cache is content-addressed, so it lives outside
+        the snapshots and is shared by all versions.
+        """
+        self.snapshot_dir = Path(directory)
+        self.index_path = self.snapshot_dir / "faiss_index.bin"
+        self.texts_path = self.snapshot_dir / "texts.bin"
+        self.text_offsets_path = self.snapshot_dir / "texts_offsets.npy"
+        self.metadata_path = self.snapshot_dir / "metadata.json"
+        self.chunk_ids_path = self.snapshot_dir / "chunk_ids.npy"
+        self.chunk_hashes_path = self.snapshot_dir / "chunk_hashes.npy"
+        self.features_path = self.snapshot_dir / "chunk_features.npz"
+
     def _load_cache(self):
-        """🆕 Load the saved cache"""
-        if self.index_path.exists() and self.texts_path.exists() and self.metadata_path.exists():
+        """
+        🆕 Load the saved cache
+
+        Everything is read from the snapshot named in CURRENT at this
+        moment, so a save running in another process cannot mix files
+        of two versions. Caches from before snapshots (files directly in
+        cache_dir) are still loaded.
+
+        A snapshot built with another index_type or quantization is
+        rebuilt from the embeddings cache instead of being served.
+        """
+        manifest = self.snapshots.manifest()
+        self._set_snapshot_dir(self.snapshots.snapshots_dir / manifest["version"]
+                               if manifest else self.cache_dir)
+        cache_files = [self.index_path, self.texts_path,
+                       self.metadata_path, self.chunk_ids_path, self.chunk_hashes_path]
+        if all(path.exists() for path in cache_files):
             try:
                 print("\n" + "="*70)
                 print("📂 وجدت cache محفوظ، جاري التحميل...")
 
                 # Load index
-                self.index = faiss.read_index(str(self.index_path))
-
-                # Load texts
-                with open(self.texts_path, 'rb') as f:
-                    self.texts = pickle.load(f)
-
-                # Load metadata
-                with open(self.metadata_path, 'rb') as f:
-                    self.metadata = pickle.load(f)
-
-                # Load embeddings cache
-                if self.embeddings_cache_path.exists():
-                    with open(self.embeddings_cache_path, 'rb') as f:
-                        self.embeddings_cache = pickle.load(f)
-
-                print(f"✅ تم تحميل الـ cache بنجاح!")
+                self.index = self._read_index(self.index_path)
+
+                # Load texts (mapped blob + offsets)
+                self.texts = MappedTexts(self.texts_path, self.text_offsets_path)
+
+                # Load metadata (mapped columns)
+                self.metadata = ColumnarMetadata(self.snapshot_dir, prefix="metadata")
+
+                # Load chunk ids and content digests
+                self.chunk_ids = np.load(self.chunk_ids_path, mmap_mode='r')
+                self.chunk_hashes = np.load(self.chunk_hashes_path, mmap_mode='r')
+                self._update_id_positions()
+                self._mapped = True
+
+                # Load chunk features (computed once if missing or outdated)
+                loaded_dir = self.snapshot_dir
+                self.features = None
+                if self.features_path.exists():
+                    self.features = ChunkFeatures.load(self.features_path)
+                rebuilt_features = self.features is None
+                if rebuilt_features:
+                    self.features = ChunkFeatures.build(self.texts)
+
+                # Load per-subject indexes
+                self._load_subject_indexes()
+
+                if self._index_config_changed(manifest or {}):
+                    print(f"🔧 تغيّر نوع الفهرس ({self.index_type}, {self.quantization})، "
+                          f"إعادة البناء من embeddings cache...")
+                    self.build_index(self.texts, self.metadata, self.chunk_ids)
+                elif rebuilt_features and self.snapshot_dir == loaded_dir:
+                    # Published snapshots are immutable: the new features go
+                    # into a new version (unless one was saved above)
+                    self._save_cache()
+
+                print(f"✅ تم تحميل الـ cache بنجاح! ({self.snapshot_dir.name})")
                 print(f"📊 عدد النصوص: {len(self.texts)}")
                 print(f"💾 عدد embeddings محفوظة: {len(self.embeddings_cache)}")
                 print("="*70 + "\n")
@@ -86,36 +219,173 @@ class RAGSystem:
             except Exception as e:
                 print(f"⚠️ فشل تحميل الـ cache: {e}")
                 print("سيتم إعادة بناء الفهرس...")
+                self.index = None
+                self.subject_indexes = {}
+                self.texts = []
+                self.metadata = []
+                self.chunk_ids = []
+                self.chunk_hashes = []
+                self.id_to_position = {}
+                self.features = ChunkFeatures()
+                self._mapped = False
                 return False
 
         return False
 
     def _save_cache(self):
-        """🆕 Save cache to disk"""
+        """
+        🆕 Save cache to disk
+
+        The files are written into a new snapshot directory, which
+        becomes the live version only once everything is on disk.
+        """
+        tmp_dir = None
         try:
             print("\n💾 جاري حفظ الـ cache...")
 
+            tmp_dir = self.snapshots.begin()
+            self._set_snapshot_dir(tmp_dir)
+
             # Save index
             if self.index is not None:
-                faiss.write_index(self.index, str(self.index_path))
+                self._write_index(self.index, self.index_path)
+
+            # Save per-subject indexes
+            for subject, index in self.subject_indexes.items():
+                self._write_index(index, self._subject_index_path(subject))
 
             # Save texts
-            with open(self.texts_path, 'wb') as f:
-                pickle.dump(self.texts, f)
+            MappedTexts.write(self.texts, self.texts_path, self.text_offsets_path)
 
             # Save metadata
-            with open(self.metadata_path, 'wb') as f:
-                pickle.dump(self.metadata, f)
+            ColumnarMetadata.write(self.metadata, self.snapshot_dir, prefix="metadata")
+
+            # Save chunk ids and content digests
+            self._save_array(self.chunk_ids_path, np.array(self.chunk_ids, dtype='int64'))
+            self._save_array(self.chunk_hashes_path, np.array(self.chunk_hashes, dtype='S16'))
+
+            # Save chunk features
+            self.features.save(self.features_path)
+
+            # Publish the new version
+            self._set_snapshot_dir(self.snapshots.commit(
+                tmp_dir, {"count": len(self.texts), "model": self.model_name,
+                          "index_type": self.index_type, "quantization": self.quantization}))
+            tmp_dir = None
+            self._remove_legacy_files()
 
             # Save embeddings cache
-            with open(self.embeddings_cache_path, 'wb') as f:
-                pickle.dump(self.embeddings_cache, f)
+            self.embeddings_cache.save()
 
             print("✅ تم حفظ الـ cache بنجاح!")
-            print(f"📁 الموقع: {self.cache_dir}")
+            print(f"📁 الموقع: {self.snapshot_dir}")
 
         except Exception as e:
             print(f"⚠️ فشل حفظ الـ cache: {e}")
+            if tmp_dir is not None:
+                self.snapshots.abort(tmp_dir)
+                self._set_snapshot_dir(self.snapshots.current() or self.cache_dir)
+
+    def _index_config_changed(self, manifest):
+        """
+        True when the loaded snapshot was built for another index_type
+        or quantization (older snapshots without them: when an index is
+        not of the type index_type calls for)
+        """
+        if "index_type" not in manifest:
+            return self.index_outdated()
+        return (manifest["index_type"] != self.index_type
+                or manifest.get("quantization") != self.quantization)
+
+    def _remove_legacy_files(self):
+        """Delete cache files of the layout before snapshots (directly in cache_dir)"""
+        patterns = ["faiss_index*.bin", "texts.bin", "texts_offsets.npy", "metadata.json",
+                    "metadata_*.npy", "chunk_ids.npy", "chunk_hashes.npy", "chunk_features.npz"]
+        for pattern in patterns:
+            for path in self.cache_dir.glob(pattern):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # Still mapped by another process (Windows)
+
+    def _read_index(self, path):
+        """🆕 Read an index, memory-mapped (read-only) when possible"""
+        index = None
+        if self.use_mmap:
+            flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+            try:
+                index = faiss.read_index(str(path), flags | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                index = None  # Index type without mmap support
+
+        if index is None:
+            index = faiss.read_index(str(path))
+
+        self._apply_search_params(index)
+        return index
+
+    def _write_index(self, index, path):
+        """
+        Write an index through a temp file + rename
+
+        Overwriting a file in place would corrupt the pages that other
+        processes (or this one) still have mapped.
+        """
+        tmp_path = Path(str(path) + ".tmp")
+        faiss.write_index(index, str(tmp_path))
+        os.replace(tmp_path, path)
+
+    def _save_array(self, path, array):
+        """Write a .npy file through a temp file + rename"""
+        tmp_path = Path(str(path) + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+
+    def _content_hash(self, text, meta):
+        """
+        Digest used to detect edited chunks
+
+        Covers the metadata too: a chunk moved to another subject must
+        leave its old subject index.
+        """
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(json.dumps(meta, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        return digest.hexdigest().encode("ascii")
+
+    def _update_id_positions(self):
+        """Rebuild the chunk id -> position lookup (after any change)"""
+        self._subject_masks = {}
+        self.result_cache.clear()
+        self.id_to_position = {
+            int(chunk_id): position for position, chunk_id in enumerate(self.chunk_ids)
+        }
+
+    def _ensure_writable(self):
+        """
+        🆕 Switch from mapped read-only data to in-memory copies
+
+        Mapped indexes cannot grow, so this is called before any change.
+        """
+        if not self._mapped:
+            return
+
+        if self.index is not None:
+            self.index = faiss.deserialize_index(faiss.serialize_index(self.index))
+            self._apply_search_params(self.index)
+
+        for subject, index in self.subject_indexes.items():
+            index = faiss.deserialize_index(faiss.serialize_index(index))
+            self._apply_search_params(index)
+            self.subject_indexes[subject] = index
+
+        self.texts = list(self.texts)
+        self.metadata = list(self.metadata)
+        self.chunk_ids = [int(chunk_id) for chunk_id in self.chunk_ids]
+        self.chunk_hashes = list(self.chunk_hashes)
+        self._mapped = False
 
     def _preprocess_for_embedding(self, text):
         """Pre-process text before embedding"""
@@ -126,49 +396,97 @@ class RAGSystem:
 
     def embed_text(self, text):
         """Convert text to embedding"""
-        text_hash = hash(text)
-        if text_hash in self.embeddings_cache:
-            return self.embeddings_cache[text_hash]
-
         processed_text = self._preprocess_for_embedding(text)
-        embedding = self.model.encode(processed_text, convert_to_numpy=True)
-        self.embeddings_cache[text_hash] = embedding
+        cache_key = self.embeddings_cache.key(processed_text)
+
+        embedding = self.embeddings_cache.get(cache_key)
+        if embedding is not None:
+            return embedding
+
+        embedding = self.model.encode([processed_text])[0]
+        self.embeddings_cache.put(cache_key, embedding)
 
         return embedding
 
-    def build_index(self, texts, metadata):
-        """🔧 Build search index - enhanced with Cache saving"""
+    def embed_texts(self, texts, batch_size=None, show_progress=False):
+        """
+        🆕 Convert a list of texts to embeddings in batches
 
-        # 🆕 Check for updated cache
-        if self.index is not None and len(self.texts) == len(texts):
-            print("\n✅ الفهرس موجود بالفعل، لا حاجة لإعادة البناء!")
-            return
+        - Texts already in the cache are not re-encoded
+        - Missing texts are sorted by length so that each batch holds
+          texts of similar size (less padding inside the model)
+        - Results are returned in the original order and stored in the cache
+        """
+        batch_size = batch_size or self.batch_size
+        embeddings = [None] * len(texts)
+
+        processed = [self._preprocess_for_embedding(text) for text in texts]
+        cache_keys = [self.embeddings_cache.key(text) for text in processed]
+
+        missing = []
+        for i, cache_key in enumerate(cache_keys):
+            embeddings[i] = self.embeddings_cache.get(cache_key)
+            if embeddings[i] is None:
+                missing.append(i)
+
+        # Length-sorted bucketing: similar lengths end up in the same batch
+        missing.sort(key=lambda i: len(processed[i]))
+
+        for start in range(0, len(missing), batch_size):
+            batch_ids = missing[start:start + batch_size]
+            batch_embeddings = self.model.encode(
+                [processed[i] for i in batch_ids], batch_size=batch_size)
+
+            for i, embedding in zip(batch_ids, batch_embeddings):
+                embeddings[i] = embedding
+                self.embeddings_cache.put(cache_keys[i], embedding)
+
+            if show_progress:
+                print(f"   معالجة: {min(start + batch_size, len(missing))}/{len(missing)}")
+
+        return embeddings
+
+    def build_index(self, texts, metadata, ids=None):
+        """
+        🔧 Build search index from scratch - enhanced with Cache saving
+
+        Args:
+            texts: Chunk texts
+            metadata: One dict per chunk (must contain "subject")
+            ids: Chunk ids (textbook_content.id); positions are used if omitted
+
+        Use sync_index to update an existing index incrementally.
+        """
+        if ids is None:
+            ids = list(range(len(texts)))
 
         print("\n" + "="*70)
         print("🔨 بناء فهرس RAG...")
         print(f"📊 عدد النصوص: {len(texts)}")
 
-        self.texts = texts
-        self.metadata = metadata
+        self.texts = list(texts)
+        self.metadata = list(metadata)
+        self.chunk_ids = [int(chunk_id) for chunk_id in ids]
+        self.chunk_hashes = [self._content_hash(text, meta)
+                             for text, meta in zip(self.texts, self.metadata)]
+        self._update_id_positions()
+        self.features = ChunkFeatures.build(self.texts)
+        self._mapped = False
 
         print("⚙️  توليد embeddings...")
-        embeddings = []
-
-        for i, text in enumerate(texts):
-            if (i + 1) % 50 == 0:
-                print(f"   معالجة: {i + 1}/{len(texts)}")
-
-            embedding = self.embed_text(text)
-            embeddings.append(embedding)
+        embeddings = self.embed_texts(texts, show_progress=True)
 
         embeddings = np.array(embeddings).astype('float32')
 
         print("🔍 بناء فهرس البحث...")
         dimension = embeddings.shape[1]
 
-        self.index = faiss.IndexFlatIP(dimension)
         faiss.normalize_L2(embeddings)
-        self.index.add(embeddings)
+        self.index = faiss.IndexIDMap2(self._create_index(embeddings))
+        self.index.add_with_ids(embeddings, np.array(self.chunk_ids, dtype='int64'))
+
+        self.subject_indexes = {}
+        self._add_to_subject_indexes(embeddings, self.metadata, self.chunk_ids)
 
         print(f"✅ تم بناء الفهرس! ({dimension} أبعاد)")
         print("="*70 + "\n")
@@ -176,6 +494,246 @@ class RAGSystem:
         # 🆕 Save cache
         self._save_cache()
 
+    def _create_index(self, embeddings, index_type=None, quantization="default"):
+        """
+        🆕 Create (and train) the search index according to index_type
+
+        Small corpora fall back to an exact flat index: training an
+        approximate index on too few vectors only loses accuracy. ivf_pq
+        falls back to ivf_flat below 256 vectors, the number of centroids
+        each 8-bit PQ codebook needs to train.
+
+        quantization stores the vectors as "fp16" (2 bytes per value) or
+        "int8" (1 byte per value) instead of float32. It applies to flat,
+        ivf_flat and hnsw; ivf_pq is already compressed.
+        """
+        count, dimension = embeddings.shape
+        index_type = index_type or self.index_type
+        if quantization == "default":
+            quantization = self.quantization
+
+        if index_type not in ("flat", "ivf_flat", "ivf_pq", "hnsw"):
+            raise ValueError(f"Unknown index_type: {index_type}")
+        if quantization not in (None, "fp16", "int8"):
+            raise ValueError(f"Unknown quantization: {quantization}")
+
+        requested, index_type = index_type, self._index_type_for(count, index_type)
+        if index_type == "flat" and requested != "flat":
+            print(f"ℹ️ عدد النصوص قليل ({count})، استخدام فهرس flat")
+        elif index_type != requested:
+            print(f"ℹ️ عدد النصوص قليل لتدريب PQ ({count})، استخدام فهرس ivf_flat")
+
+        storage = {None: "Flat", "fp16": "SQfp16", "int8": "SQ8"}[quantization]
+
+        if index_type == "flat":
+            if quantization is None:
+                return faiss.IndexFlatIP(dimension)
+            description = storage
+        elif index_type == "hnsw":
+            description = f"HNSW{self.hnsw_m},{storage}"
+        else:
+            # IVF: ~4*sqrt(n) lists, with at least 39 training vectors per list
+            nlist = self.nlist or int(4 * np.sqrt(count))
+            nlist = max(1, min(nlist, count // 39))
+
+            if index_type == "ivf_pq":
+                if dimension % self.pq_m != 0:
+                    raise ValueError(
+                        f"pq_m={self.pq_m} must divide the embedding dimension {dimension}")
+                description = f"IVF{nlist},PQ{self.pq_m}"
+            else:
+                description = f"IVF{nlist},{storage}"
+
+        index = faiss.index_factory(
+            dimension, description, faiss.METRIC_INNER_PRODUCT)
+
+        if not index.is_trained:
+            print(f"🎓 تدريب الفهرس ({description})...")
+            index.train(embeddings)
+        self._apply_search_params(index)
+
+        return index
+
+    def _index_type_for(self, count, index_type=None):
+        """Index type _create_index builds for count vectors (after the small-corpus fallbacks)"""
+        index_type = index_type or self.index_type
+        if index_type != "flat" and count < self.min_ann_size:
+            return "flat"
+        if index_type == "ivf_pq" and count < 256:
+            return "ivf_flat"
+        return index_type
+
+    @staticmethod
+    def _live_index_type(index):
+        """index_type of a built index (inside its IndexIDMap2)"""
+        index = faiss.downcast_index(index)
+        if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            index = faiss.downcast_index(index.index)
+        if isinstance(index, faiss.IndexHNSW):
+            return "hnsw"
+        if isinstance(index, faiss.IndexIVFPQ):
+            return "ivf_pq"
+        if isinstance(index, faiss.IndexIVF):
+            return "ivf_flat"
+        return "flat"
+
+    def index_outdated(self):
+        """
+        🆕 True when the global or a subject index is not the type
+        index_type calls for at its current size
+
+        Indexes grown with add_texts keep the type they were created
+        with, e.g. flat from a first small batch: build_index trains
+        them again once the corpus is large enough.
+        """
+        indexes = list(self.subject_indexes.values())
+        if self.index is not None:
+            indexes.append(self.index)
+        return any(self._live_index_type(index) != self._index_type_for(index.ntotal)
+                   for index in indexes)
+
+    def quantization_report(self, k=10, sample_size=200, query_texts=None):
+        """
+        🆕 Recall and memory of quantized indexes against the float32 baseline
+
+        Builds a flat index per storage type (float32, fp16, int8) over the
+        current corpus and measures:
+        - recall@k: overlap with the exact float32 top-k
+        - bytes: serialized index size
+
+        Args:
+            k: Neighbours compared per query
+            sample_size: Number of corpus chunks used as queries
+                         (ignored when query_texts is given)
+            query_texts: Optional real questions to use as queries
+        """
+        if len(self.texts) == 0:
+            print("⚠️ الفهرس فارغ!")
+            return {}
+
+        # Corpus vectors come from the embeddings cache
+        embeddings = np.array(self.embed_texts(list(self.texts))).astype('float32')
+        faiss.normalize_L2(embeddings)
+
+        if query_texts:
+            queries = self._embed_queries(list(query_texts))
+        else:
+            rng = np.random.default_rng(0)
+            sample = rng.choice(len(embeddings), min(sample_size, len(embeddings)), replace=False)
+            queries = embeddings[sample]
+
+        k = min(k, len(embeddings))
+        report = {}
+        baseline = None
+
+        for quantization in (None, "fp16", "int8"):
+            index = self._create_index(embeddings, index_type="flat", quantization=quantization)
+            index.add(embeddings)
+            _, neighbours = index.search(queries, k)
+
+            if baseline is None:
+                baseline = neighbours
+
+            recall = np.mean([
+                len(set(found) & set(expected)) / k
+                for found, expected in zip(neighbours, baseline)
+            ])
+            name = quantization or "float32"
+            report[name] = {
+                "recall_at_k": float(recall),
+                "bytes": len(faiss.serialize_index(index))
+            }
+
+        print("\n" + "="*70)
+        print(f"📏 تقرير الضغط (recall@{k}, {len(queries)} استعلام)")
+        for name, row in report.items():
+            ratio = report["float32"]["bytes"] / max(row["bytes"], 1)
+            print(f"   {name:8s} recall={row['recall_at_k']:.3f} "
+                  f"size={row['bytes'] / (1024 * 1024):.2f} MB (x{ratio:.1f} أصغر)")
+        print("="*70 + "\n")
+
+        return report
+
+    def _apply_search_params(self, index):
+        """Apply query-time parameters (nprobe / efSearch) to an index"""
+        try:
+            faiss.extract_index_ivf(index).nprobe = self.nprobe
+        except RuntimeError:
+            pass  # Not an IVF index
+
+        # Every index is wrapped in an IndexIDMap2: the HNSW graph is inside
+        hnsw_index = faiss.downcast_index(index)
+        if isinstance(hnsw_index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            hnsw_index = faiss.downcast_index(hnsw_index.index)
+        if hasattr(hnsw_index, "hnsw"):
+            hnsw_index.hnsw.efSearch = self.ef_search
+
+    def _subject_index_path(self, subject):
+        return self.snapshot_dir / f"faiss_index_{subject}.bin"
+
+    def _add_to_subject_indexes(self, embeddings, metadata, chunk_ids):
+        """
+        🆕 Add normalized embeddings to the per-subject indexes
+
+        Each sub-index is an IndexIDMap2 labelled with chunk ids, like
+        the global index.
+        """
+        positions_by_subject = {}
+        for offset, meta in enumerate(metadata):
+            positions_by_subject.setdefault(meta["subject"], []).append(offset)
+
+        for subject, offsets in positions_by_subject.items():
+            subject_embeddings = np.ascontiguousarray(embeddings[offsets])
+            ids = np.array([chunk_ids[offset] for offset in offsets], dtype='int64')
+
+            if subject not in self.subject_indexes:
+                self.subject_indexes[subject] = faiss.IndexIDMap2(
+                    self._create_index(subject_embeddings))
+
+            self.subject_indexes[subject].add_with_ids(subject_embeddings, ids)
+
+    def _load_subject_indexes(self):
+        """Load the per-subject indexes, rebuilding any that are missing"""
+        self.subject_indexes = {}
+        missing = False
+
+        subjects = self.metadata.categories("subject") if len(self.metadata) else []
+        for subject in sorted(subjects):
+            path = self._subject_index_path(subject)
+            if path.exists():
+                self.subject_indexes[subject] = self._read_index(path)
+            else:
+                missing = True
+
+        if missing:
+            # Older cache without partitions: vectors come from the embeddings cache
+            print("🔨 بناء فهارس المواد...")
+            self._ensure_writable()
+            self.subject_indexes = {}
+            embeddings = np.array(self.embed_texts(self.texts)).astype('float32')
+            faiss.normalize_L2(embeddings)
+            self._add_to_subject_indexes(embeddings, self.metadata, self.chunk_ids)
+            self._save_cache()
+
+    def set_search_params(self, nprobe=None, ef_search=None):
+        """
+        🆕 Tune approximate search at query time
+
+        Args:
+            nprobe: Number of inverted lists visited (IVF indexes)
+            ef_search: Size of the candidate list (HNSW indexes)
+        """
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+
+        if self.index is not None:
+            self._apply_search_params(self.index)
+        for index in self.subject_indexes.values():
+            self._apply_search_params(index)
+        self.result_cache.clear()
+
     def search(self, query, k=5, min_score=0.4, subject_filter=None):
         """
         Search for the closest texts to the query - enhanced
@@ -185,90 +743,286 @@ class RAGSystem:
         - Increase min_score from 0.35 to 0.4 (more strict)
         - Add better result filtering
         - Assess result quality
+        - subject_filter searches only that subject's index
+        """
+        return self.search_batch([query], k=k, min_score=min_score,
+                                 subject_filter=subject_filter)[0]
+
+    def search_batch(self, queries, k=5, min_score=0.4, subject_filter=None):
+        """
+        🆕 Search several queries at once
+
+        Uncached queries are encoded in one batch and looked up with one
+        multi-query index search. Returns one result list per query, the
+        same as calling search for each of them.
         """
         if self.index is None or len(self.texts) == 0:
             print("⚠️ الفهرس فارغ!")
-            return []
+            return [[] for _ in queries]
+
+        # 🆕 Repeated questions are answered from the result cache
+        results = [None] * len(queries)
+        cache_keys = []
+        pending = []
+        for i, query in enumerate(queries):
+            cache_key = ("search", self._preprocess_for_embedding(query), k, min_score, subject_filter)
+            cache_keys.append(cache_key)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                results[i] = copy.deepcopy(cached)
+            else:
+                pending.append(i)
+
+        if not pending:
+            return results
+
+        query_embeddings = self._embed_queries([queries[i] for i in pending])
+
+        # Search for more results for filtering (k * 5 candidates)
+        all_candidates = self._dense_candidates(
+            query_embeddings, k * 5, min_score, subject_filter)
+
+        for i, candidates in zip(pending, all_candidates):
+            query_results = self._build_results(candidates, queries[i])
+
+            # Sort by quality and score
+            query_results = sorted(
+                query_results,
+                key=lambda x: (x["quality"]["overall_score"], x["score"]),
+                reverse=True
+            )
+
+            # 🆕 Cross-encoder reranking of the best candidates (within its time budget)
+            if self.reranker is not None:
+                query_results = self.reranker.rerank(queries[i], query_results)
+
+            # 🆕 Prefer distinct content over near-duplicate chunks
+            if self.mmr_lambda is not None:
+                query_results = self._diversify(query_results, k, subject_filter)
+            else:
+                query_results = query_results[:k]
+
+            self.result_cache.put(cache_keys[i], copy.deepcopy(query_results))
+            results[i] = query_results
+
+        return results
+
+    def _diversify(self, results, k, subject_filter):
+        """
+        🆕 Maximal marginal relevance over the ranked results
+
+        Picks results one at a time, maximizing
+            mmr_lambda * relevance - (1 - mmr_lambda) * max cosine similarity
+                                                       to the results already picked
+        so chunks that overlap (chunk_text overlap) do not fill the top k.
+        Relevance is the rerank score when there is one, else the quality
+        score. mmr_lambda = 1 keeps the ranked order.
+        """
+        count = min(k, len(results))
+        if count <= 1:
+            return results[:count]
+
+        vectors = self._candidate_vectors([result["id"] for result in results], subject_filter)
+        similarity = vectors @ vectors.T
+        relevance = np.array([result.get("rerank_score", result["quality"]["overall_score"])
+                              for result in results])
+
+        selected = [0]
+        available = np.ones(len(results), dtype=bool)
+        available[0] = False
+        max_similarity = similarity[0].copy()
+
+        while len(selected) < count:
+            mmr = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * max_similarity
+            mmr[~available] = -np.inf
+            best = int(np.argmax(mmr))
+            selected.append(best)
+            available[best] = False
+            max_similarity = np.maximum(max_similarity, similarity[best])
+
+        return [results[i] for i in selected]
+
+    def _candidate_vectors(self, chunk_ids, subject_filter):
+        """
+        Normalized vectors of the candidates, read back from the index
 
-        query_embedding = self.embed_text(
-            query).reshape(1, -1).astype('float32')
-        faiss.normalize_L2(query_embedding)
+        Runs on the query path, so it never calls the encoder: IVF
+        indexes keep no id -> vector map and are read from the
+        embeddings cache instead, where an evicted vector comes back
+        as zeros.
+        """
+        index = self.subject_indexes.get(subject_filter, self.index)
+        try:
+            vectors = np.vstack([index.reconstruct(int(chunk_id)) for chunk_id in chunk_ids])
+        except RuntimeError:
+            vectors = np.zeros((len(chunk_ids), index.d), dtype='float32')
+            for row, chunk_id in enumerate(chunk_ids):
+                text = self.texts[self.id_to_position[int(chunk_id)]]
+                vector = self.embeddings_cache.get(
+                    self.embeddings_cache.key(self._preprocess_for_embedding(text)))
+                if vector is not None:
+                    vectors[row] = vector
+
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    def _embed_query(self, query):
+        """Normalized (1, d) float32 query embedding"""
+        return self._embed_queries([query])
+
+    def _embed_queries(self, queries):
+        """
+        Normalized (n, d) float32 query embeddings
 
-        # Search for more results for filtering
-        scores, indices = self.index.search(
-            query_embedding, min(k * 5, len(self.texts)))  # increase count for filtering
+        🆕 Served from the in-memory LRU cache for repeated questions;
+        the others are encoded together in one batch. Queries are not
+        written to the persistent embeddings cache.
+        """
+        processed = [self._preprocess_for_embedding(query) for query in queries]
+        embeddings = [self.query_embedding_cache.get(text) for text in processed]
+
+        missing = sorted({text for text, embedding in zip(processed, embeddings)
+                          if embedding is None})
+        if missing:
+            encoded = np.asarray(self.model.encode(missing, batch_size=self.batch_size),
+                                 dtype='float32').reshape(len(missing), -1)
+            faiss.normalize_L2(encoded)
+
+            new_embeddings = {}
+            for text, embedding in zip(missing, encoded):
+                new_embeddings[text] = embedding.reshape(1, -1)
+                self.query_embedding_cache.put(text, new_embeddings[text])
+
+            embeddings = [new_embeddings.get(text) if embedding is None else embedding
+                          for text, embedding in zip(processed, embeddings)]
+
+        return np.vstack(embeddings).astype('float32')
+
+    def _dense_candidates(self, query_embeddings, count, min_score, subject_filter):
+        """Nearest chunks of each query as lists of (chunk_id, position, score)"""
+        # 🆕 Route subject-filtered queries to the subject's own index
+        index = self.subject_indexes.get(subject_filter, self.index)
+        if index.ntotal == 0:
+            return [[] for _ in query_embeddings]
+
+        scores, indices = index.search(
+            query_embeddings, min(count, index.ntotal))
+
+        all_candidates = []
+        for query_scores, query_indices in zip(scores, indices):
+            candidates = []
+            for score, chunk_id in zip(query_scores, query_indices):
+                idx = self.id_to_position.get(int(chunk_id))
+                if idx is not None and score >= min_score:
+                    # 🔧 Strict subject filtering
+                    if subject_filter:
+                        if self.metadata[idx]["subject"] != subject_filter:
+                            continue  # Skip results from other subjects entirely
+
+                    candidates.append((int(chunk_id), idx, float(score)))
+            all_candidates.append(candidates)
+
+        return all_candidates
+
+    def _build_results(self, candidates, query):
+        """Turn (chunk_id, position, score) candidates into result dicts"""
+        # 🆕 Score all candidates at once from the precomputed features
+        quality = self.features.quality([idx for _, idx, _ in candidates], query)
 
         results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < len(self.texts) and score >= min_score:
-                # 🔧 Strict subject filtering
-                if subject_filter:
-                    if self.metadata[idx]["subject"] != subject_filter:
-                        continue  # Skip results from other subjects entirely
-
-                results.append({
-                    "text": self.texts[idx],
-                    "metadata": self.metadata[idx],
-                    "score": float(score),
-                    "relevance": self._get_relevance_label(score),
-                    "quality": self._assess_result_quality(self.texts[idx], query)
-                })
-
-        # Sort by quality and score
-        results = sorted(
-            results,
-            key=lambda x: (x["quality"]["overall_score"], x["score"]),
-            reverse=True
-        )
-
-        return results[:k]
-
-    def _assess_result_quality(self, text, query):
-        """
-        🆕 Assess result quality
-
-        Checks:
-        1. Presence of keywords from the query in the text
-        2. Text length (not too short)
-        3. Content diversity
-        """
-        quality = {
-            "keyword_match": 0,
-            "length_score": 0,
-            "diversity_score": 0,
-            "overall_score": 0
-        }
+        for i, (chunk_id, idx, score) in enumerate(candidates):
+            results.append({
+                "id": chunk_id,
+                "text": self.texts[idx],
+                "metadata": self.metadata[idx],
+                "score": score,
+                "relevance": self._get_relevance_label(score),
+                "quality": {name: float(values[i]) for name, values in quality.items()}
+            })
+
+        return results
+
+    def _subject_mask(self, subject):
+        """Boolean array: which positions belong to the subject"""
+        if subject not in self._subject_masks:
+            if isinstance(self.metadata, ColumnarMetadata):
+                # Compare the mapped category codes directly
+                categories = self.metadata.categories("subject")
+                code = categories.index(subject) if subject in categories else -1
+                mask = np.asarray(self.metadata.column("subject")) == code
+            else:
+                mask = np.array(
+                    [meta["subject"] == subject for meta in self.metadata], dtype=bool)
+            self._subject_masks[subject] = mask
+        return self._subject_masks[subject]
+
+    def _lexical_candidates(self, query, count, subject_filter):
+        """🆕 Best BM25 matches as a list of (position, bm25 score)"""
+        scores = self.features.bm25(query)
+        if subject_filter:
+            scores = np.where(self._subject_mask(subject_filter), scores, 0)
+
+        count = min(count, int(np.count_nonzero(scores)))
+        if count == 0:
+            return []
 
-        # 1. Check keywords
-        query_words = set(self._extract_keywords(query))
-        text_words = set(self._extract_keywords(text))
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top])]
+        return [(int(position), float(scores[position])) for position in top]
 
-        if query_words:
-            matched = query_words.intersection(text_words)
-            quality["keyword_match"] = len(matched) / len(query_words)
+    def hybrid_search(self, query, k=5, min_score=0.3, subject_filter=None, rrf_k=60):
+        """
+        🆕 Dense + BM25 search fused with reciprocal rank fusion
 
-        # 2. Check length
-        if 100 <= len(text) <= 1000:
-            quality["length_score"] = 1.0
-        elif len(text) < 100:
-            quality["length_score"] = len(text) / 100
-        else:
-            quality["length_score"] = 0.8
+        - Dense candidates come from the vector index (k * 5)
+        - Lexical candidates come from the BM25 inverted index (k * 5),
+          which catches exact terms such as "مدرسة الديوان"
+        - Each candidate gets sum(1 / (rrf_k + rank)) over both lists
+
+        min_score only applies to candidates found by the dense search.
+        """
+        if self.index is None or len(self.texts) == 0:
+            print("⚠️ الفهرس فارغ!")
+            return []
+
+        cache_key = ("hybrid", self._preprocess_for_embedding(query), k, min_score,
+                     subject_filter, rrf_k)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
+        query_embedding = self._embed_query(query)
+
+        dense = self._dense_candidates(
+            query_embedding, k * 5, min_score, subject_filter)[0]
+        lexical = self._lexical_candidates(query, k * 5, subject_filter)
+
+        fused = {}
+        dense_scores = {}
+        for rank, (chunk_id, idx, score) in enumerate(dense):
+            fused[idx] = fused.get(idx, 0) + 1 / (rrf_k + rank + 1)
+            dense_scores[idx] = score
+        for rank, (idx, _) in enumerate(lexical):
+            fused[idx] = fused.get(idx, 0) + 1 / (rrf_k + rank + 1)
 
-        # 3. Check diversity
-        unique_words = len(set(text.split()))
-        total_words = len(text.split())
-        if total_words > 0:
-            quality["diversity_score"] = min(unique_words / total_words, 1.0)
+        # Dense similarity of lexical-only hits (vectors read back from the index)
+        lexical_only = [idx for idx in fused if idx not in dense_scores]
+        if lexical_only:
+            vectors = self._candidate_vectors(
+                [int(self.chunk_ids[idx]) for idx in lexical_only], subject_filter)
+            for idx, score in zip(lexical_only, vectors @ query_embedding[0]):
+                dense_scores[idx] = float(score)
 
-        # Overall score
-        quality["overall_score"] = (
-            quality["keyword_match"] * 0.5 +
-            quality["length_score"] * 0.3 +
-            quality["diversity_score"] * 0.2
-        )
+        ranked = sorted(fused, key=fused.get, reverse=True)[:k]
+        candidates = [(int(self.chunk_ids[idx]), idx, dense_scores[idx]) for idx in ranked]
 
-        return quality
+        results = self._build_results(candidates, query)
+        for result, idx in zip(results, ranked):
+            result["fused_score"] = fused[idx]
+
+        self.result_cache.put(cache_key, copy.deepcopy(results))
+        return results
 
     def search_with_quality_filter(self, query, k=5, min_quality=0.3, subject_filter=None):
         """
@@ -283,41 +1037,18 @@ class RAGSystem:
         return self.search(query, k=k, min_score=min_quality, subject_filter=subject_filter)
 
     def search_with_keywords(self, query, k=5, subject_filter=None):
-        """Search with keywords as fallback - enhanced"""
-        # First: regular search with quality filtering
-        results = self.search_with_quality_filter(
-            query, k=k, min_quality=0.3, subject_filter=subject_filter)
-
-        # If we don't find enough results, search by keywords
-        if len(results) < 2:
-            keywords = self._extract_keywords(query)
-
-            for keyword in keywords[:3]:  # Only the first 3 words
-                if len(keyword) > 3:
-                    more_results = self.search(
-                        keyword, k=3, min_score=0.3, subject_filter=subject_filter)
-                    results.extend(more_results)
-
-        # Remove duplicates
-        seen_texts = set()
-        unique_results = []
-        for result in results:
-            text_hash = hash(result["text"])
-            if text_hash not in seen_texts:
-                seen_texts.add(text_hash)
-                unique_results.append(result)
-
-        return unique_results[:k]
+        """
+        Search with keywords - enhanced
+
+        🆕 One hybrid (dense + BM25) retrieval instead of extra dense
+        searches for each keyword.
+        """
+        return self.hybrid_search(
+            query, k=k, min_score=0.3, subject_filter=subject_filter)
 
     def _extract_keywords(self, text):
         """Extract keywords from text"""
-        text = re.sub(r'[إأآا]', 'ا', text)
-        text = re.sub(r'[ىي]', 'ي', text)
-
-        words = re.findall(r'[\u0600-\u06FF]+', text)
-        keywords = [w for w in words if len(w) > 3]
-
-        return keywords
+        return extract_keywords(text)
 
     def _get_relevance_label(self, score):
         """Classify similarity score"""
@@ -330,38 +1061,143 @@ class RAGSystem:
         else:
             return "ضعيف"
 
-    def add_texts(self, new_texts, new_metadata):
-        """Add new texts"""
+    def add_texts(self, new_texts, new_metadata, new_ids=None, save=True):
+        """Add new texts (new_ids: chunk ids, generated if omitted)"""
         print(f"➕ إضافة {len(new_texts)} نص جديد...")
 
-        new_embeddings = []
-        for text in new_texts:
-            embedding = self.embed_text(text)
-            new_embeddings.append(embedding)
+        if new_ids is None:
+            next_id = max(self.id_to_position, default=-1) + 1
+            new_ids = list(range(next_id, next_id + len(new_texts)))
+
+        if self.index is None:
+            self.build_index(new_texts, new_metadata, new_ids)
+            return
+
+        self._ensure_writable()
+
+        new_embeddings = self.embed_texts(new_texts)
 
         new_embeddings = np.array(new_embeddings).astype('float32')
         faiss.normalize_L2(new_embeddings)
 
-        self.index.add(new_embeddings)
+        new_ids = [int(chunk_id) for chunk_id in new_ids]
+        self.index.add_with_ids(new_embeddings, np.array(new_ids, dtype='int64'))
+        self._add_to_subject_indexes(new_embeddings, new_metadata, new_ids)
         self.texts.extend(new_texts)
         self.metadata.extend(new_metadata)
+        self.chunk_ids.extend(new_ids)
+        self.chunk_hashes.extend(self._content_hash(text, meta)
+                                 for text, meta in zip(new_texts, new_metadata))
+        self._update_id_positions()
+        self.features.append(new_texts)
 
         print(f"✅ تمت الإضافة! إجمالي النصوص: {len(self.texts)}")
 
         # 🆕 Save updated cache
+        if save:
+            self._save_cache()
+
+    def remove_ids(self, ids, save=True):
+        """
+        🆕 Remove chunks by id
+
+        Returns False when the index type cannot delete vectors (HNSW);
+        the caller then has to rebuild.
+        """
+        ids = {int(chunk_id) for chunk_id in ids if int(chunk_id) in self.id_to_position}
+        if not ids:
+            return True
+
+        self._ensure_writable()
+        ids_array = np.array(sorted(ids), dtype='int64')
+
+        try:
+            self.index.remove_ids(ids_array)
+            for index in self.subject_indexes.values():
+                index.remove_ids(ids_array)
+        except RuntimeError:
+            return False
+
+        # A subject whose chunks are all gone has no partition any more
+        self.subject_indexes = {subject: index for subject, index in self.subject_indexes.items()
+                                if index.ntotal}
+
+        keep = [position for position, chunk_id in enumerate(self.chunk_ids)
+                if chunk_id not in ids]
+        self.texts = [self.texts[position] for position in keep]
+        self.metadata = [self.metadata[position] for position in keep]
+        self.chunk_ids = [self.chunk_ids[position] for position in keep]
+        self.chunk_hashes = [self.chunk_hashes[position] for position in keep]
+        self._update_id_positions()
+        self.features.keep(keep)
+
+        print(f"➖ تم حذف {len(ids)} نص")
+
+        if save:
+            self._save_cache()
+        return True
+
+    def sync_index(self, ids, texts, metadata):
+        """
+        🆕 Bring the index in line with the database rows
+
+        Only the difference is applied:
+        - ids not in the index are embedded and added
+        - ids no longer in the database are removed
+        - ids whose text or metadata (subject, chapter, page) changed are
+          removed and re-added
+
+        Returns a dict with the number of added / deleted / updated chunks.
+        """
+        ids = [int(chunk_id) for chunk_id in ids]
+
+        if self.index is None:
+            self.build_index(texts, metadata, ids)
+            return {"added": len(ids), "deleted": 0, "updated": 0}
+
+        incoming = set(ids)
+        deleted = [chunk_id for chunk_id in self.id_to_position if chunk_id not in incoming]
+        added = []
+        updated = []
+
+        for position, chunk_id in enumerate(ids):
+            current = self.id_to_position.get(chunk_id)
+            if current is None:
+                added.append(position)
+            elif self.chunk_hashes[current] != self._content_hash(texts[position],
+                                                                  metadata[position]):
+                updated.append(position)
+
+        summary = {"added": len(added), "deleted": len(deleted), "updated": len(updated)}
+
+        if not (added or deleted or updated):
+            print("\n✅ الفهرس محدث بالفعل، لا حاجة لإعادة البناء!")
+            return summary
+
+        print(f"\n🔄 مزامنة الفهرس: +{len(added)} / -{len(deleted)} / ~{len(updated)}")
+
+        removed = self.remove_ids(deleted + [ids[p] for p in updated], save=False)
+        if not removed:
+            # The index cannot delete vectors: rebuild (embeddings come from the cache)
+            self.build_index(texts, metadata, ids)
+            return summary
+
+        changed = added + updated
+        if changed:
+            self.add_texts([texts[p] for p in changed],
+                           [metadata[p] for p in changed],
+                           [ids[p] for p in changed], save=False)
+
         self._save_cache()
+        return summary
 
     def clear_cache(self):
         """🆕 Delete the saved cache"""
         try:
-            if self.index_path.exists():
-                os.remove(self.index_path)
-            if self.texts_path.exists():
-                os.remove(self.texts_path)
-            if self.metadata_path.exists():
-                os.remove(self.metadata_path)
-            if self.embeddings_cache_path.exists():
-                os.remove(self.embeddings_cache_path)
+            self.snapshots.clear()
+            self._remove_legacy_files()
+            self._set_snapshot_dir(self.cache_dir)
+            self.embeddings_cache.clear()
 
             print("✅ تم حذف الـ cache بنجاح!")
         except Exception as e:
@@ -372,7 +1208,14 @@ class RAGSystem:
         return {
             "total_texts": len(self.texts),
             "index_size": self.index.ntotal if self.index else 0,
+            "subject_index_sizes": {
+                subject: index.ntotal for subject, index in self.subject_indexes.items()
+            },
             "cache_size": len(self.embeddings_cache),
-            "cache_exists": self.index_path.exists()
+            "query_embedding_cache": self.query_embedding_cache.stats(),
+            "result_cache": self.result_cache.stats(),
+            "reranker": self.reranker.stats() if self.reranker else None,
+            "cache_exists": self.index_path.exists(),
+            "snapshot": self.snapshot_dir.name if self.snapshot_dir != self.cache_dir else None
         }
     
\ No newline at end of file
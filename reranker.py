@@ -0,0 +1,156 @@
+import time
+
+import numpy as np
+
+
+class CrossEncoderReranker:
+    """
+    🆕 Cross-encoder reranking of the best RAG candidates on CPU
+
+    - Only the top_n candidates (after the quality sort) are scored,
+      in batches of batch_size (query, chunk) pairs
+    - time_budget_ms bounds the added latency per query: the stage is
+      skipped when not even one batch is expected to fit (running
+      average cost per pair), and stops early once the budget is used
+      up; candidates that were not scored keep their order after the
+      scored ones
+    - Each reranked result gets a "rerank_score" in [0, 1]
+    """
+
+    def __init__(self, model_name="cross-encoder/mmarco-mMiniLMv2-L12-H384-v1", top_n=20,
+                 time_budget_ms=150, batch_size=16, max_length=256):
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, max_length=max_length)
+        self.top_n = top_n
+        self.time_budget = time_budget_ms / 1000
+        self.batch_size = batch_size
+
+        self.seconds_per_pair = None  # running average, None until the first batch
+        self.reranked = 0
+        self.partial = 0
+        self.skipped = 0
+
+        # The first call is much slower (lazy initialization): keep it out of the average
+        self.model.predict([("سؤال", "نص")], show_progress_bar=False)
+
+    def rerank(self, query, results):
+        """Return the results with the top_n reordered by cross-encoder score"""
+        head, tail = results[:self.top_n], results[self.top_n:]
+        if len(head) < 2:
+            return results
+
+        if (self.seconds_per_pair is not None
+                and self.seconds_per_pair * min(len(head), self.batch_size) > self.time_budget):
+            self.skipped += 1
+            self.seconds_per_pair *= 0.9  # try again once the load may have dropped
+            return results
+
+        start = time.perf_counter()
+        scores = []
+        for batch_start in range(0, len(head), self.batch_size):
+            batch = head[batch_start:batch_start + self.batch_size]
+
+            batch_time = time.perf_counter()
+            batch_scores = self.model.predict(
+                [(query, result["text"]) for result in batch],
+                batch_size=self.batch_size, show_progress_bar=False)
+            scores.extend(np.asarray(batch_scores, dtype=np.float32).ravel().tolist())
+            self._record(time.perf_counter() - batch_time, len(batch))
+
+            if time.perf_counter() - start > self.time_budget:
+                break
+
+        scored = [dict(result, rerank_score=float(score))
+                  for result, score in zip(head, scores)]
+        scored.sort(key=lambda result: result["rerank_score"], reverse=True)
+
+        if len(scores) < len(head):
+            self.partial += 1
+        else:
+            self.reranked += 1
+        return scored + head[len(scores):] + tail
+
+    def _record(self, seconds, pairs):
+        per_pair = seconds / pairs
+        if self.seconds_per_pair is None:
+            self.seconds_per_pair = per_pair
+        else:
+            self.seconds_per_pair = 0.8 * self.seconds_per_pair + 0.2 * per_pair
+
+    def stats(self):
+        return {
+            "reranked": self.reranked,
+            "partial": self.partial,
+            "skipped": self.skipped,
+            "ms_per_pair": self.seconds_per_pair * 1000 if self.seconds_per_pair else None
+        }
+
+
+def benchmark(rag_system, reranker, queries, k=5, repeats=3):
+    """
+    Latency added by reranking, per query
+
+    Runs every query through RAGSystem.search with and without the
+    reranker (query and result caches cleared each time) and returns the p50/p95
+    of both and of the difference, in milliseconds.
+    """
+    previous = rag_system.reranker
+    plain, reranked = [], []
+
+    try:
+        for _ in range(repeats):
+            for query in queries:
+                for reranker_used, timings in ((None, plain), (reranker, reranked)):
+                    rag_system.reranker = reranker_used
+                    rag_system.result_cache.clear()
+                    rag_system.query_embedding_cache.clear()
+                    start = time.perf_counter()
+                    rag_system.search(query, k=k)
+                    timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        rag_system.reranker = previous
+        rag_system.result_cache.clear()
+
+    plain = np.array(plain)
+    reranked = np.array(reranked)
+    added = reranked - plain
+
+    report = {
+        "queries": len(queries) * repeats,
+        "search_p50_ms": float(np.percentile(plain, 50)),
+        "search_p95_ms": float(np.percentile(plain, 95)),
+        "reranked_p50_ms": float(np.percentile(reranked, 50)),
+        "reranked_p95_ms": float(np.percentile(reranked, 95)),
+        "added_p50_ms": float(np.percentile(added, 50)),
+        "added_p95_ms": float(np.percentile(added, 95)),
+        "reranker": reranker.stats()
+    }
+
+    print("\n" + "="*70)
+    print(f"⏱️ زمن إعادة الترتيب ({report['queries']} استعلام، top_n={reranker.top_n})")
+    print(f"   بدون:  p50={report['search_p50_ms']:.1f} ms  p95={report['search_p95_ms']:.1f} ms")
+    print(f"   مع:    p50={report['reranked_p50_ms']:.1f} ms  p95={report['reranked_p95_ms']:.1f} ms")
+    print(f"   الفرق: p50={report['added_p50_ms']:.1f} ms  p95={report['added_p95_ms']:.1f} ms")
+    print(f"   {report['reranker']}")
+    print("="*70 + "\n")
+    return report
+
+
+if __name__ == "__main__":
+    from rag_server import create_rag_system
+
+    sample_queries = [
+        "ما هي الخلية؟",
+        "ما وظيفة الغشاء البلازمي",
+        "اشرح التكاثر الجنسي واللاجنسي",
+        "ما هي الهرمونات",
+        "كيف يعمل جهاز المناعة",
+        "ما هي مدرسة الديوان",
+        "خصائص الشعر الحديث",
+        "ما هو المبتدأ والخبر",
+    ]
+
+    rag = create_rag_system()
+    benchmark(rag, rag.reranker or CrossEncoderReranker(), sample_queries)
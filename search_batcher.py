@@ -0,0 +1,127 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# RAGSystem methods that change the index: run one at a time, between batches
+WRITE_METHODS = {"sync_index", "add_texts", "remove_ids", "build_index", "set_search_params"}
+
+
+class SearchBatcher:
+    """
+    🆕 Micro-batching in front of RAGSystem.search
+
+    Queries that arrive within max_wait_ms of each other are answered
+    together: one encoder forward pass and one multi-query index search
+    (RAGSystem.search_batch) per group of identical search parameters.
+    Callers block on their own result as with a plain search call.
+
+    Any other attribute is forwarded to the wrapped RAGSystem, so the
+    batcher can be used wherever a RAGSystem is expected. The index
+    updates in WRITE_METHODS hold the batcher's lock, so they never run
+    while the worker thread is searching.
+    """
+
+    def __init__(self, rag_system, max_batch_size=32, max_wait_ms=5):
+        self.rag_system = rag_system
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.batched_queries = 0
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()  # one search_batch or one index update at a time
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="rag-search-batcher", daemon=True)
+        self._thread.start()
+
+    def __getattr__(self, name):
+        attribute = getattr(self.rag_system, name)
+        if name not in WRITE_METHODS:
+            return attribute
+
+        def locked(*args, **kwargs):
+            with self._lock:
+                return attribute(*args, **kwargs)
+        return locked
+
+    def submit(self, query, k=5, min_score=0.4, subject_filter=None):
+        """Queue a search and return a Future with its result list"""
+        if self._closed:
+            raise RuntimeError("SearchBatcher is closed")
+
+        future = Future()
+        self._queue.put((query, (k, min_score, subject_filter), future))
+        return future
+
+    def search(self, query, k=5, min_score=0.4, subject_filter=None):
+        return self.submit(query, k=k, min_score=min_score,
+                           subject_filter=subject_filter).result()
+
+    def search_with_quality_filter(self, query, k=5, min_quality=0.3, subject_filter=None):
+        return self.search(query, k=k, min_score=min_quality, subject_filter=subject_filter)
+
+    def _collect(self):
+        """Wait for one request, then gather more until the window closes"""
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # stop after this batch
+                break
+            batch.append(item)
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            groups = {}
+            for query, params, future in batch:
+                if future.set_running_or_notify_cancel():
+                    groups.setdefault(params, []).append((query, future))
+
+            for (k, min_score, subject_filter), requests in groups.items():
+                try:
+                    with self._lock:
+                        results = self.rag_system.search_batch(
+                            [query for query, _ in requests],
+                            k=k, min_score=min_score, subject_filter=subject_filter)
+                except Exception as e:
+                    for _, future in requests:
+                        future.set_exception(e)
+                    continue
+
+                for (_, future), result in zip(requests, results):
+                    future.set_result(result)
+
+            self.batches += 1
+            self.batched_queries += len(batch)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "queries": self.batched_queries,
+            "average_batch_size": self.batched_queries / self.batches if self.batches else 0.0
+        }
+
+    def close(self):
+        """Answer the queued searches, then stop the worker thread"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
@@ -4,9 +4,16 @@ from telegram.ext import Updater, CommandHandler, MessageHandler, Filters, Callb
 from telegram.ext.dispatcher import Dispatcher
 from telegram.error import TelegramError
 from database_manager import DatabaseManager
-from rag_system import RAGSystem
+from rag_server import RAGClient, create_rag_system
+from search_batcher import SearchBatcher
 from ai_generator import AIGenerator
 from text_classifier import TextClassifier
+import config
+
+# 🆕 Optional settings: an older config.py without them keeps the defaults
+RAG_SERVER_ADDRESS = getattr(config, "RAG_SERVER_ADDRESS", None)
+RAG_BATCH_WAIT_MS = getattr(config, "RAG_BATCH_WAIT_MS", 5)
+RAG_MAX_BATCH_SIZE = getattr(config, "RAG_MAX_BATCH_SIZE", 32)
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -20,7 +27,15 @@ class StudyAssistantBot:
     def __init__(self, token):
         self.token = token
         self.db_manager = DatabaseManager()
-        self.rag_system = RAGSystem()
+        if RAG_SERVER_ADDRESS:
+            # 🆕 Shared search server: no local copy of the model and index
+            self.rag_system = RAGClient(RAG_SERVER_ADDRESS)
+        elif RAG_BATCH_WAIT_MS:
+            # 🆕 Concurrent questions share one encoder pass and index search
+            self.rag_system = SearchBatcher(create_rag_system(), RAG_MAX_BATCH_SIZE,
+                                            RAG_BATCH_WAIT_MS)
+        else:
+            self.rag_system = create_rag_system()
         self.ai_generator = AIGenerator()
         self.text_classifier = TextClassifier()
         self._initialize_rag_system()
@@ -32,31 +47,38 @@ class StudyAssistantBot:
 
     def _initialize_rag_system(self):
         """Initialize the RAG system with content from the database"""
-        biology_content = self.db_manager.get_textbook_content("biology")
-        arabic_content = self.db_manager.get_textbook_content("arabic")
+        self.sync_rag_index()
+
+    def sync_rag_index(self):
+        """
+        🆕 Apply database changes to the RAG index
 
+        Rows are tracked by textbook_content.id, so only added, deleted
+        or edited chunks are embedded again. Safe to call while the bot
+        is answering when searches go through the search server or a
+        SearchBatcher (both keep searches out during the update); with
+        neither, call it before the bot starts handling messages.
+        """
+        rows = self.db_manager.get_textbook_rows(["biology", "arabic"])
+
+        all_ids = []
         all_texts = []
         all_metadata = []
 
-        for chapter, content, page in biology_content:
-            all_texts.append(content)
-            all_metadata.append({
-                "subject": "biology",
-                "chapter": chapter,
-                "page": page
-            })
-
-        for chapter, content, page in arabic_content:
+        for row_id, subject, chapter, content, page in rows:
+            all_ids.append(row_id)
             all_texts.append(content)
             all_metadata.append({
-                "subject": "arabic",
+                "subject": subject,
                 "chapter": chapter,
                 "page": page
             })
 
         if all_texts:
-            self.rag_system.build_index(all_texts, all_metadata)
+            summary = self.rag_system.sync_index(all_ids, all_texts, all_metadata)
             print(f"✅ تم تحميل {len(all_texts)} قطعة نصية في نظام RAG")
+            return summary
+        return None
 
     def error_handler(self, update: Update, context: CallbackContext, error: TelegramError):
         """Error handler"""
@@ -907,9 +929,11 @@ class StudyAssistantBot:
         ))
 
         dispatcher.add_handler(CommandHandler("start", self.start))
-        dispatcher.add_handler(CallbackQueryHandler(self.button))
+        # 🆕 run_async: questions from different students are handled in
+        # parallel, so their searches can be batched together
+        dispatcher.add_handler(CallbackQueryHandler(self.button, run_async=True))
         dispatcher.add_handler(MessageHandler(
-            Filters.text & ~Filters.command, self.handle_message))
+            Filters.text & ~Filters.command, self.handle_message, run_async=True))
 
         print("✅ البوت يعمل الآن...")
         self.updater.start_polling()
@@ -2,6 +2,24 @@ import re
 import unicodedata
 
 
+def normalize_arabic(text):
+    """
+    🆕 Character normalization shared by clean_text and the full-text
+    index: NFKC, no diacritics or tatweel, one form of alef, yaa and
+    taa marbuta
+    """
+    text = unicodedata.normalize('NFKC', text)
+
+    # Remove diacritics
+    text = re.sub(r'[\u064B-\u0652\u0640]', '', text)
+
+    # Normalize characters
+    text = re.sub(r'[إأآا]', 'ا', text)
+    text = re.sub(r'[ىي]', 'ي', text)
+    text = re.sub(r'ة', 'ه', text)
+    return text
+
+
 class TextPreprocessor:
     def __init__(self):
         # Basic Arabic stop words list
@@ -15,16 +33,8 @@ class TextPreprocessor:
         if not text:
             return ""
 
-        # Unicode normalization
-        text = unicodedata.normalize('NFKC', text)
-
-        # Remove diacritics
-        text = re.sub(r'[\u064B-\u0652\u0640]', '', text)
-
-        # Normalize characters
-        text = re.sub(r'[إأآا]', 'ا', text)
-        text = re.sub(r'[ىي]', 'ي', text)
-        text = re.sub(r'ة', 'ه', text)
+        # Unicode normalization, diacritics, alef/yaa/taa marbuta
+        text = normalize_arabic(text)
 
         # Remove unwanted characters
         text = re.sub(